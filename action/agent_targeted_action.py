@@ -55,6 +55,7 @@ class AndAgentTargeted(AgentTargeted):
         return ' and '.join([targeted.__repr__() for targeted in self.targeted_set])
 
 class DealAttackDamage(AgentTargeted):
+    # default listeners, every battle plays with its own copy in battle_state.attack_damage_event
     event: Event[int, tuple[Agent, GameState, BattleState, Agent]] = Event()
     def __init__(self, val: Value, times: Value = ConstValue(1)):
         super().__init__(val)
@@ -62,13 +63,14 @@ class DealAttackDamage(AgentTargeted):
         self.times = times
     
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState, target: Agent) -> None:
-        self.event.broadcast_before((by, game_state, battle_state, target))
+        event = battle_state.attack_damage_event
+        event.broadcast_before((by, game_state, battle_state, target))
         amount = self.val.get()
-        amount = self.event.broadcast_apply(amount, (by, game_state, battle_state, target))
+        amount = event.broadcast_apply(amount, (by, game_state, battle_state, target))
         times = self.times.get()
         for _ in range(times):
             target.get_damaged(round(amount))
-        self.event.broadcast_after((by, game_state, battle_state, target))
+        event.broadcast_after((by, game_state, battle_state, target))
     
     def __repr__(self) -> str:
         if self.times.peek() != 1:
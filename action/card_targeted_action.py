@@ -1,7 +1,6 @@
 from __future__ import annotations
 from value import Value
 from action.action import Action
-import copy
 from target.card_target import CardTarget, CardPile
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -88,13 +87,13 @@ class AddCopy(CardTargetedL2):
     
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState, target: Card) -> None:
         if self.card_pile == CardPile.DISCARD:
-            battle_state.discard_pile.append(copy.deepcopy(target))
+            battle_state.add_card(battle_state.discard_pile, target.clone())
         elif self.card_pile == CardPile.DRAW:
-            battle_state.draw_pile.append(copy.deepcopy(target))
+            battle_state.add_card(battle_state.draw_pile, target.clone())
         elif self.card_pile == CardPile.HAND:
-            battle_state.hand.append(copy.deepcopy(target))
+            battle_state.add_card(battle_state.hand, target.clone())
         elif self.card_pile == CardPile.EXHAUST:
-            battle_state.exhaust_pile.append(copy.deepcopy(target))
+            battle_state.add_card(battle_state.exhaust_pile, target.clone())
         else:
             raise Exception("Unrecognized CardPile to add a copy to")
 
@@ -103,7 +102,7 @@ class UpgradeCard(CardTargetedL2):
         super().__init__()
 
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState, target: Card) -> None:
-        target.upgrade()
+        battle_state.upgrade_card(target)
 
 class DiscardCard(CardTargetedL2):
     def __init__(self):
@@ -1,8 +1,9 @@
 from __future__ import annotations
+import random
 from action.action import Action
 from config import Character, MAX_HEALTH
 from value import RandomUniformRange, ConstValue
-from utility import RoundRobin, RoundRobinRandomStart, ItemSet, ItemSequence, RandomizedItemSet, PreventRepeats
+from utility import Zobrist, RoundRobin, RoundRobinRandomStart, ItemSet, ItemSequence, RandomizedItemSet, PreventRepeats
 from action.action import EndAgentTurn
 from action.agent_targeted_action import DealAttackDamage, AddBlock, ApplyStatus
 from target.agent_target import PlayerAgentTarget, SelfAgentTarget
@@ -23,7 +24,25 @@ class Agent:
         self.status_effect_state = StatusEffectState()
         self.name = name
         self.prev_action: Action|None = None
+
+    def clone(self) -> Agent:
+        # actions and bots are shared, only health, block and status effects are per battle
+        ret = self.__class__.__new__(self.__class__)
+        ret.__dict__.update(self.__dict__)
+        ret.status_effect_state = self.status_effect_state.clone()
+        return ret
+
+    def get_state(self):
+        return (self.health, self.block, self.prev_action, self.status_effect_state.get_state())
+
+    def set_state(self, state):
+        self.health, self.block, self.prev_action, status_effect_state = state
+        self.status_effect_state.set_state(status_effect_state)
     
+    def get_hash(self) -> int:
+        return (Zobrist.key('health', self.name, self.health, self.max_health) + Zobrist.key('block', self.name, self.block) + \
+            self.status_effect_state.hash * (Zobrist.key('status', self.name) | 1)) & Zobrist.MASK
+
     def set_name(self) -> None:
         raise NotImplementedError("Set name is not implemented for {}.".format(self.__class__.__name__))
     
@@ -79,21 +98,37 @@ class Player(Agent):
         super().__init__(CHARACTER_NAME[self.character], max_health)
     
     def _get_action(self, game_state: GameState, battle_state: BattleState):
-        return self.bot.choose_card(game_state, battle_state.copy_undeterministic())
+        action = self.bot.choose_card(game_state, battle_state.copy_undeterministic())
+        if battle_state.trace is not None:
+            battle_state.trace.record_card_choice(action)
+        return action
 
 class Enemy(Agent):
     def __init__(self, name: str, max_health: int, action_set: ItemSet[Action]):
         super().__init__(name, max_health)
         self.action_set = action_set
 
+    def clone(self) -> Enemy:
+        ret = super().clone()
+        ret.action_set = self.action_set.clone()
+        return ret
+
+    def get_state(self):
+        return (super().get_state(), self.action_set.get_state())
+
+    def set_state(self, state):
+        agent_state, action_set_state = state
+        super().set_state(agent_state)
+        self.action_set.set_state(action_set_state)
+
     def _get_action(self, game_state: GameState, battle_state: BattleState) -> Action:
-        return self.action_set.get().And(EndAgentTurn())
+        return self.action_set.get(battle_state.rng).And(EndAgentTurn())
 
     def get_intention(self, game_state: GameState, battle_state: BattleState) -> Action:
-        return self.action_set.peek()
+        return self.action_set.peek(battle_state.rng)
 
 class AcidSlimeSmall(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = RandomUniformRange(8, 12) if game_state.ascension < 7 else RandomUniformRange(9, 13)
         if game_state.ascension < 17:
             action_set: ItemSet[Action] = RoundRobinRandomStart(
@@ -105,16 +140,16 @@ class AcidSlimeSmall(Enemy):
                 DealAttackDamage(ConstValue(3 if game_state.ascension < 2 else 4)).To(PlayerAgentTarget()),
                 ApplyStatus(ConstValue(1), StatusEffectRepo.WEAK).To(PlayerAgentTarget())
             )
-        super().__init__("AcidSlime(S)", max_health.get(), action_set)
+        super().__init__("AcidSlime(S)", max_health.get(rng), action_set)
 
 class SpikeSlimeSmall(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = RandomUniformRange(10, 14) if game_state.ascension < 7 else RandomUniformRange(11, 15)
         action_set: ItemSet[Action] = RoundRobin(0, DealAttackDamage(ConstValue(5 if game_state.ascension < 2 else 6)).To(PlayerAgentTarget()))
-        super().__init__("SpikeSlime(S)", max_health.get(), action_set)
+        super().__init__("SpikeSlime(S)", max_health.get(rng), action_set)
 
 class JawWorm(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = RandomUniformRange(40, 44) if game_state.ascension < 7 else RandomUniformRange(42, 46)
         chomp: Action = DealAttackDamage(ConstValue(11 if game_state.ascension < 2 else 12)).To(PlayerAgentTarget())
         thrash: Action = DealAttackDamage(ConstValue(7)).To(PlayerAgentTarget()).And(AddBlock(ConstValue(5)).To(SelfAgentTarget()))
@@ -122,10 +157,10 @@ class JawWorm(Enemy):
         regular_turn: ItemSet[Action] = RandomizedItemSet((bellow, 0.45), (thrash, 0.30), (chomp, 0.25))
         all_turns: ItemSet[Action] = ItemSequence(chomp, regular_turn)
         action_set = PreventRepeats(all_turns, (bellow, 2), (thrash, 3), (chomp, 2), consecutive=True)
-        super().__init__("JawWorm", max_health.get(), action_set)
+        super().__init__("JawWorm", max_health.get(rng), action_set)
         
 class Goblin(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = ConstValue(44)
         slash: Action = DealAttackDamage(ConstValue(11)).To(PlayerAgentTarget())
         stand: Action = DealAttackDamage(ConstValue(7)).To(PlayerAgentTarget()).And(AddBlock(ConstValue(5)).To(SelfAgentTarget()))
@@ -133,7 +168,7 @@ class Goblin(Enemy):
         super().__init__("Goblin", max_health.get(), action_set)
 
 class HobGoblin(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = ConstValue(44)
         slash: Action = DealAttackDamage(ConstValue(22)).To(PlayerAgentTarget())
         stand: Action = DealAttackDamage(ConstValue(10)).To(PlayerAgentTarget()).And(AddBlock(ConstValue(10)).To(SelfAgentTarget()))
@@ -141,7 +176,7 @@ class HobGoblin(Enemy):
         super().__init__("Goblin", max_health.get(), action_set)
 
 class Leech(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = ConstValue(70)
         drink: Action = DealAttackDamage(ConstValue(1)).To(PlayerAgentTarget()).And(ApplyStatus(ConstValue(1), StatusEffectRepo.WEAK).To(PlayerAgentTarget()))
         bite: Action = DealAttackDamage(ConstValue(4)).To(PlayerAgentTarget())
@@ -149,7 +184,7 @@ class Leech(Enemy):
         super().__init__("Leach", max_health.get(), action_set)
         
 class Giant(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = ConstValue(57)
         slash: Action = DealAttackDamage(ConstValue(9)).To(PlayerAgentTarget())
         bash: Action = DealAttackDamage(ConstValue(8)).To(PlayerAgentTarget())
@@ -157,7 +192,7 @@ class Giant(Enemy):
         super().__init__("Giant", max_health.get(), action_set)
         
 class Troll(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = ConstValue(46)
         slash: Action = DealAttackDamage(ConstValue(9)).To(PlayerAgentTarget())
         bash: Action = DealAttackDamage(ConstValue(5)).To(PlayerAgentTarget())
@@ -166,7 +201,7 @@ class Troll(Enemy):
         super().__init__("Troll", max_health.get(), action_set)
         
 class Donut(Enemy):
-    def __init__(self, game_state: GameState):
+    def __init__(self, game_state: GameState, rng=random):
         max_health = ConstValue(250)
         slash: Action = DealAttackDamage(ConstValue(12)).To(PlayerAgentTarget())
         bash: Action = DealAttackDamage(ConstValue(4)).To(PlayerAgentTarget())
@@ -179,5 +214,6 @@ for c in dir():
     if isinstance(globals()[c], type) and issubclass(globals()[c], Enemy):
         enemy_index[c] = globals()[c]
 
-def make_enemy(name, game_state):
-    return enemy_index[name](game_state)
+# rng draws the random parts of the enemy, e.g. its health
+def make_enemy(name, game_state, rng=random):
+    return enemy_index[name](game_state, rng)
@@ -0,0 +1,583 @@
+from __future__ import annotations
+import numpy as np
+from action.action import Action, AndAction, AddMana, DrawCard, EndAgentTurn
+from action.agent_targeted_action import AgentTargetedAction, AgentTargeted, AndAgentTargeted, DealAttackDamage, DealDamage, AddBlock, ApplyStatus
+from action.card_targeted_action import CardTargetedL1, Exhaust, AddCopy, UpgradeCard, DiscardCard
+from target.agent_target import AgentSet, SelfAgentTarget, PlayerAgentTarget, ChooseAgentTarget, AllAgentsTarget, RandomAgentTarget
+from target.card_target import CardPile, SelfCardTarget, ChooseCardTarget
+from status_effecs import StatusEffectRepo
+from utility import ItemSet
+from config import CardType, MAX_BLOCK, MAX_MANA, MAX_STATUS
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from battle import BattleState
+    from card import CardDefinition
+    from agent import Enemy
+
+# Vectorized battles: N battles held as NumPy arrays (structure of arrays) and advanced in lockstep,
+# one player decision for every running battle per step.
+# Piles are card counts per kind (name and upgrade count), so the order of the draw pile is not kept:
+# it is always a uniformly shuffled pile, which is what the battle's own reshuffles and copy_undeterministic give.
+# Enemies are in slots, each with its behaviour state (see EnemyBehaviours) that decides its next move.
+
+# the status effects of StatusEffectRepo that stack by adding up, Tolerance does not stack,
+# and how each of them changes at the end of its side's turn
+STATUSES = [StatusEffectRepo.VULNERABLE, StatusEffectRepo.WEAK, StatusEffectRepo.STRENGTH, StatusEffectRepo.VIGOR, StatusEffectRepo.TOLERANCE]
+VULNERABLE, WEAK, STRENGTH, VIGOR, TOLERANCE = range(len(STATUSES))
+STATUS_END_TURN = np.array([-1, -1, 0, 0, 2], dtype=np.int32)
+# bombs of the player, counted per number of turns left
+BOMB_TIMERS = 8
+BOMB_DAMAGE = 40
+# cards are upgraded at most this often by cards like Armament
+MAX_UPGRADES = 10
+
+class UnsupportedException(Exception):
+    pass
+
+# What a card or an enemy move does. The batch applies the parts in this order: the attack and the statuses
+# on its targets, then self damage, block, statuses and bombs of the performer, mana, draws and upgrades.
+# Every card of CardGen and every enemy move of agent.py gives the same result in this order as in its own.
+class Effects:
+    def __init__(self):
+        self.cost = 0
+        self.damage = 0
+        self.hits = 0
+        # None, 'one' or 'all' agents of the other side
+        self.target: str|None = None
+        self.target_status = np.zeros(len(STATUSES), dtype=np.int32)
+        self.self_status = np.zeros(len(STATUSES), dtype=np.int32)
+        self.bomb = 0
+        self.self_damage = 0
+        self.block = 0
+        self.mana = 0
+        self.draw = 0
+        self.exhaust = False
+        self.copy = False
+        self.upgrade = False
+        self.power = False
+
+    def _set_target(self, target: str):
+        if self.target is not None and self.target != target:
+            raise UnsupportedException("Actions with different targets in one card")
+        self.target = target
+
+    def add(self, action: Action|CardTargetedL1, by_player: bool):
+        if isinstance(action, AndAction):
+            for sub_action in action.actions:
+                self.add(sub_action, by_player)
+        elif isinstance(action, AgentTargetedAction):
+            target = action.target
+            if isinstance(target, SelfAgentTarget):
+                self.add_targeted(action.targeted, None)
+            elif not by_player and isinstance(target, PlayerAgentTarget):
+                self.add_targeted(action.targeted, 'one')
+            elif by_player and isinstance(target, (ChooseAgentTarget, RandomAgentTarget)) and target.among == AgentSet.ENEMY:
+                self.add_targeted(action.targeted, 'one')
+            elif by_player and isinstance(target, AllAgentsTarget) and target.among == AgentSet.ENEMY:
+                self.add_targeted(action.targeted, 'all')
+            else:
+                raise UnsupportedException(f"Target {target}")
+        elif isinstance(action, AddMana):
+            self.mana += action.val.peek()
+        elif isinstance(action, DrawCard):
+            self.draw += action.val.peek()
+        elif isinstance(action, EndAgentTurn):
+            pass
+        elif isinstance(action, CardTargetedL1) and by_player:
+            targeted, target = action.card_targetd, action.target
+            if isinstance(targeted, Exhaust) and isinstance(target, SelfCardTarget):
+                self.exhaust = True
+            elif isinstance(targeted, AddCopy) and targeted.card_pile == CardPile.DISCARD and isinstance(target, SelfCardTarget):
+                self.copy = True
+            elif isinstance(targeted, UpgradeCard) and isinstance(target, ChooseCardTarget) and target.among == CardPile.HAND:
+                self.upgrade = True
+            elif not isinstance(targeted, DiscardCard):
+                raise UnsupportedException(f"Card action {action}")
+        else:
+            raise UnsupportedException(f"Action {action}")
+
+    # target is None for the performer itself
+    def add_targeted(self, targeted: AgentTargeted, target: str|None):
+        if isinstance(targeted, AndAgentTargeted):
+            for sub_targeted in targeted.targeted_set:
+                self.add_targeted(sub_targeted, target)
+        elif isinstance(targeted, DealAttackDamage) and target is not None:
+            if self.hits > 0:
+                raise UnsupportedException("More than one attack in one card")
+            self._set_target(target)
+            self.damage = targeted.val.peek()
+            self.hits = targeted.times.peek()
+        elif isinstance(targeted, DealDamage) and target is None:
+            self.self_damage += targeted.val.peek() * targeted.times.peek()
+        elif isinstance(targeted, AddBlock) and target is None:
+            self.block += targeted.val.peek()
+        elif isinstance(targeted, ApplyStatus) and targeted.status_effect is StatusEffectRepo.BOMB and target is None:
+            self.bomb = targeted.val.peek()
+            if not 0 < self.bomb < BOMB_TIMERS:
+                raise UnsupportedException(f"Bomb of {self.bomb} turns")
+        elif isinstance(targeted, ApplyStatus) and targeted.status_effect in STATUSES:
+            index = STATUSES.index(targeted.status_effect)
+            if target is None:
+                self.self_status[index] += targeted.val.peek()
+            else:
+                self._set_target(target)
+                self.target_status[index] += targeted.val.peek()
+        else:
+            raise UnsupportedException(f"{targeted} to {target if target is not None else 'self'}")
+
+    @staticmethod
+    def from_card(definition: CardDefinition) -> Effects:
+        effects = Effects()
+        effects.cost = definition.mana_cost.peek()
+        effects.power = definition.card_type == CardType.POWER
+        for action in definition.actions:
+            effects.add(action, True)
+        return effects
+
+    @staticmethod
+    def from_move(action: Action) -> Effects:
+        effects = Effects()
+        effects.add(action, False)
+        if effects.target == 'all' or effects.bomb or effects.self_damage or effects.mana or effects.draw:
+            raise UnsupportedException(f"Enemy move {action}")
+        return effects
+
+# A random generator that takes a given sequence of choices, used to enumerate every outcome of an ItemSet.
+# Only randrange and choices are supported, which is all that the enemies of agent.py draw.
+class _ScriptedRandom:
+    MAX_CHOICES = 32
+
+    class TooDeepException(Exception):
+        pass
+
+    def __init__(self, prefix: list[int]):
+        self.prefix = prefix
+        self.taken: list[int] = []
+        self.options: list[int] = []
+        self.probability = 1.0
+
+    def _choose(self, weights: list[float]) -> int:
+        if len(self.taken) >= _ScriptedRandom.MAX_CHOICES:
+            raise _ScriptedRandom.TooDeepException()
+        i = self.prefix[len(self.taken)] if len(self.taken) < len(self.prefix) else 0
+        self.taken.append(i)
+        self.options.append(len(weights))
+        self.probability *= weights[i] / sum(weights)
+        return i
+
+    def randrange(self, start: int, stop: int) -> int:
+        return start + self._choose([1] * (stop - start))
+
+    def choices(self, population, weights=None, k=1):
+        assert k == 1, "Only single choices can be enumerated"
+        return [population[self._choose(weights if weights is not None else [1] * len(population))]]
+
+    # the distinct results of run and their probabilities; branches that choose too often
+    # (e.g. repeated rejections of PreventRepeat) are dropped and the rest is renormalized
+    @staticmethod
+    def enumerate(run: Callable[[_ScriptedRandom], object]) -> dict[object, float]:
+        outcomes: dict[object, float] = {}
+        prefixes: list[list[int]] = [[]]
+        while prefixes:
+            prefix = prefixes.pop()
+            rng = _ScriptedRandom(prefix)
+            try:
+                result = run(rng)
+                if rng.probability > 0:
+                    outcomes[result] = outcomes.get(result, 0) + rng.probability
+            except _ScriptedRandom.TooDeepException:
+                pass
+            for depth in range(len(prefix), len(rng.options)):
+                for option in range(1, rng.options[depth]):
+                    prefixes.append(rng.taken[:depth] + [option])
+        total = sum(outcomes.values())
+        return {result: probability / total for result, probability in outcomes.items()}
+
+def _get_actions(item_set: ItemSet, actions: list[Action]) -> list[Action]:
+    for name, value in vars(item_set).items():
+        if name == 'cur':
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, ItemSet):
+                _get_actions(item, actions)
+            elif isinstance(item, Action) and not any(item is action for action in actions):
+                actions.append(item)
+    return actions
+
+# item set states hold the enemy's own actions, they are replaced by their index to compare enemies of a class
+def _freeze(state, actions: list[Action]):
+    if isinstance(state, Action):
+        return ('action', next(i for i, action in enumerate(actions) if action is state))
+    if isinstance(state, (list, tuple)):
+        return tuple(_freeze(value, actions) for value in state)
+    return state
+
+def _thaw(state, actions: list[Action]):
+    if isinstance(state, tuple):
+        if len(state) == 2 and state[0] == 'action':
+            return actions[state[1]]
+        return tuple(_thaw(value, actions) for value in state)
+    return state
+
+# The behaviour of the enemies as a Markov chain. A behaviour state is the state of an enemy's action set
+# (e.g. the index of a RoundRobin or the counters of PreventRepeat), every state has the moves it can make
+# with their probabilities and the state each of them leads to. States are found from the enemies that are
+# loaded and compiled once per process.
+class EnemyBehaviours:
+    def __init__(self):
+        self.templates: dict[tuple[str, int], tuple[ItemSet, list[Action]]] = {}
+        self.state_ids: dict[tuple, int] = {}
+        self.move_ids: dict[tuple, int] = {}
+        self.outcomes: list[list[tuple[float, int, int]]] = []
+        self.moves: list[Effects] = []
+        self.built = -1
+
+    def get_state_id(self, enemy: Enemy, ascension: int) -> int:
+        key = (enemy.__class__.__name__, ascension)
+        if key not in self.templates:
+            template = enemy.action_set.clone()
+            self.templates[key] = (template, _get_actions(template, []))
+        state = (key, _freeze(enemy.action_set.get_state(), _get_actions(enemy.action_set, [])))
+        if state not in self.state_ids:
+            self._explore(state)
+        return self.state_ids[state]
+
+    def _add_state(self, state: tuple, pending: list[tuple]) -> int:
+        if state not in self.state_ids:
+            self.state_ids[state] = len(self.state_ids)
+            self.outcomes.append([])
+            pending.append(state)
+        return self.state_ids[state]
+
+    def _explore(self, state: tuple):
+        pending: list[tuple] = []
+        self._add_state(state, pending)
+        while pending:
+            state = pending.pop()
+            key, frozen = state
+            template, actions = self.templates[key]
+            def run(rng):
+                template.set_state(_thaw(frozen, actions))
+                move = template.get(rng)
+                return _freeze(move, actions), _freeze(template.get_state(), actions)
+            outcomes = []
+            for (move, next_frozen), probability in _ScriptedRandom.enumerate(run).items():
+                if (key, move) not in self.move_ids:
+                    self.move_ids[(key, move)] = len(self.moves)
+                    self.moves.append(Effects.from_move(_thaw(move, actions)))
+                outcomes.append((probability, self.move_ids[(key, move)], self._add_state((key, next_frozen), pending)))
+            self.outcomes[self.state_ids[state]] = outcomes
+
+    # tables of every state's outcomes (padded, with cumulative probabilities) and of every move's effects
+    def get_tables(self):
+        if self.built != len(self.outcomes) + len(self.moves):
+            width = max(len(outcomes) for outcomes in self.outcomes)
+            self.cumulative = np.full((len(self.outcomes), width), 2.0)
+            self.outcome_move = np.zeros((len(self.outcomes), width), dtype=np.int32)
+            self.outcome_next = np.zeros((len(self.outcomes), width), dtype=np.int32)
+            for i, outcomes in enumerate(self.outcomes):
+                self.cumulative[i, :len(outcomes)] = np.cumsum([probability for probability, _, _ in outcomes])
+                self.cumulative[i, len(outcomes) - 1] = 1.0
+                self.outcome_move[i, :len(outcomes)] = [move for _, move, _ in outcomes]
+                self.outcome_next[i, :len(outcomes)] = [next_state for _, _, next_state in outcomes]
+            self.move_damage = np.array([move.damage for move in self.moves], dtype=np.int32)
+            self.move_hits = np.array([move.hits for move in self.moves], dtype=np.int32)
+            self.move_block = np.array([move.block for move in self.moves], dtype=np.int32)
+            self.move_target_status = np.array([move.target_status for move in self.moves], dtype=np.int32)
+            self.move_self_status = np.array([move.self_status for move in self.moves], dtype=np.int32)
+            # the next move of every state expected over its outcomes: attack damage (before modifiers) times hits,
+            # hits, block, the statuses it applies to the other side and to itself
+            moves = np.concatenate([(self.move_damage * self.move_hits)[:, None], self.move_hits[:, None], self.move_block[:, None], self.move_target_status, self.move_self_status], axis=1)
+            self.expected_moves = np.zeros((len(self.outcomes), moves.shape[1]))
+            for i, outcomes in enumerate(self.outcomes):
+                for probability, move, _ in outcomes:
+                    self.expected_moves[i] += probability * moves[move]
+            self.built = len(self.outcomes) + len(self.moves)
+        return self
+
+behaviours = EnemyBehaviours()
+
+def _apply_status(status: np.ndarray, amount: np.ndarray) -> np.ndarray:
+    ret = np.minimum(status + amount, MAX_STATUS)
+    # Tolerance does not stack, the first one stays
+    ret[..., TOLERANCE] = np.where(status[..., TOLERANCE] > 0, status[..., TOLERANCE], amount[..., TOLERANCE])
+    return ret
+
+def _end_turn_status(status: np.ndarray) -> np.ndarray:
+    return np.where(status > 0, status + STATUS_END_TURN, status)
+
+def _get_damaged(health: np.ndarray, block: np.ndarray, amount: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    blocked = np.minimum(block, amount)
+    return np.maximum(health - amount + blocked, 0), block - blocked
+
+def _modify_damage(amount: np.ndarray, vulnerable: np.ndarray, weak: np.ndarray) -> np.ndarray:
+    amount = np.where(vulnerable, amount * 3 // 2, amount)
+    return np.where(weak, amount * 3 // 4, amount)
+
+# the index of a uniformly chosen option per row, weighted by counts (e.g. cards in a pile) or among True
+def _choose(rng: np.random.Generator, weights: np.ndarray) -> np.ndarray:
+    cumulative = np.cumsum(weights, axis=1)
+    r = (rng.random(len(weights)) * cumulative[:, -1]).astype(np.int64)
+    return (cumulative <= r[:, None]).sum(axis=1)
+
+# Plays uniformly among the distinct playable cards and ending the turn, like Sampler.rollout.
+# A policy gets the batch and the legal actions of every battle (columns are card kinds, the last is end turn)
+# and returns a column per battle.
+def random_policy(batch: BatchBattle, legal: np.ndarray) -> np.ndarray:
+    return _choose(batch.rng, legal)
+
+class BatchBattle:
+    def __init__(self, n: int, definitions: list[CardDefinition], enemy_slots: int, seed: int|None = None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.behaviours = behaviours
+        self._set_kinds(definitions)
+        k = len(self.kinds)
+        self.health = np.zeros(n, dtype=np.int32)
+        self.max_health = np.ones(n, dtype=np.int32)
+        self.block = np.zeros(n, dtype=np.int32)
+        self.status = np.zeros((n, len(STATUSES)), dtype=np.int32)
+        self.bombs = np.zeros((n, BOMB_TIMERS), dtype=np.int32)
+        self.mana = np.zeros(n, dtype=np.int32)
+        self.max_mana = np.zeros(n, dtype=np.int32)
+        self.draw_count = np.zeros(n, dtype=np.int32)
+        self.turn = np.zeros(n, dtype=np.int32)
+        self.steps = np.zeros(n, dtype=np.int32)
+        self.draw_pile = np.zeros((n, k), dtype=np.int32)
+        self.discard_pile = np.zeros((n, k), dtype=np.int32)
+        self.hand = np.zeros((n, k), dtype=np.int32)
+        self.exhaust_pile = np.zeros((n, k), dtype=np.int32)
+        self.enemy_health = np.zeros((n, enemy_slots), dtype=np.int32)
+        self.enemy_max_health = np.zeros((n, enemy_slots), dtype=np.int32)
+        self.enemy_block = np.zeros((n, enemy_slots), dtype=np.int32)
+        self.enemy_status = np.zeros((n, enemy_slots, len(STATUSES)), dtype=np.int32)
+        self.intent = np.zeros((n, enemy_slots), dtype=np.int32)
+        self.alive = np.zeros((n, enemy_slots), dtype=bool)
+        # as BattleState.get_end_result: 0 while running, 1 won, -1 lost
+        self.result = np.zeros(n, dtype=np.int8)
+
+    # card kinds and their effects, with the upgrades of every kind if a card can upgrade others
+    def _set_kinds(self, definitions: list[CardDefinition]):
+        self.kinds: list[tuple[str, int]] = []
+        self.kind_index: dict[tuple[str, int], int] = {}
+        self.definitions: list[CardDefinition] = []
+        effects: list[Effects] = []
+        upgrades: list[CardDefinition] = []
+        for definition in definitions:
+            self._add_kind(definition, effects, upgrades)
+        if any(effect.upgrade for effect in effects):
+            while upgrades:
+                definition = upgrades.pop()
+                if definition.upgrade_count < MAX_UPGRADES:
+                    self._add_kind(definition.upgraded(1), effects, upgrades)
+        self.upgraded = np.arange(len(self.kinds), dtype=np.int32)
+        for i, definition in enumerate(self.definitions):
+            key = (definition.name, definition.upgrade_count + 1)
+            if key in self.kind_index:
+                self.upgraded[i] = self.kind_index[key]
+        self.cost = np.array([effect.cost for effect in effects], dtype=np.int32)
+        self.damage = np.array([effect.damage for effect in effects], dtype=np.int32)
+        self.hits = np.array([effect.hits for effect in effects], dtype=np.int32)
+        self.targets_one = np.array([effect.target == 'one' for effect in effects], dtype=bool)
+        self.targets_all = np.array([effect.target == 'all' for effect in effects], dtype=bool)
+        self.target_status = np.array([effect.target_status for effect in effects], dtype=np.int32).reshape(-1, len(STATUSES))
+        self.self_status = np.array([effect.self_status for effect in effects], dtype=np.int32).reshape(-1, len(STATUSES))
+        self.bomb = np.array([effect.bomb for effect in effects], dtype=np.int32)
+        self.self_damage = np.array([effect.self_damage for effect in effects], dtype=np.int32)
+        self.card_block = np.array([effect.block for effect in effects], dtype=np.int32)
+        self.mana_gain = np.array([effect.mana for effect in effects], dtype=np.int32)
+        self.card_draw = np.array([effect.draw for effect in effects], dtype=np.int32)
+        self.exhausts = np.array([effect.exhaust for effect in effects], dtype=bool)
+        self.copies = np.array([effect.copy for effect in effects], dtype=bool)
+        self.upgrades = np.array([effect.upgrade for effect in effects], dtype=bool)
+        self.powers = np.array([effect.power for effect in effects], dtype=bool)
+
+    def _add_kind(self, definition: CardDefinition, effects: list[Effects], upgrades: list[CardDefinition]):
+        key = (definition.name, definition.upgrade_count)
+        if key in self.kind_index:
+            return
+        self.kind_index[key] = len(self.kinds)
+        self.kinds.append(key)
+        self.definitions.append(definition)
+        effects.append(Effects.from_card(definition))
+        upgrades.append(definition)
+
+    # Loads battles at a player decision (or before their first turn, which is then started).
+    # Raises UnsupportedException for cards or enemies that the batch cannot simulate.
+    @staticmethod
+    def from_states(states: list[BattleState], seed: int|None = None) -> BatchBattle:
+        definitions: list[CardDefinition] = []
+        for state in states:
+            for pile in (state.draw_pile, state.discard_pile, state.hand, state.exhaust_pile):
+                definitions += [card.definition for card in pile]
+        batch = BatchBattle(len(states), definitions, max(len(state.enemies) for state in states), seed)
+        for i, state in enumerate(states):
+            batch._load(i, state)
+        batch.behaviours.get_tables()
+        batch._start_turn(np.nonzero((batch.turn == 0) & (batch.result == 0))[0])
+        return batch
+
+    def _load(self, i: int, state: BattleState):
+        player = state.player
+        self.health[i], self.max_health[i], self.block[i] = player.health, player.max_health, player.block
+        self.status[i] = [player.status_effect_state.get(status) for status in STATUSES]
+        for bomb in player.status_effect_state._get_obj(StatusEffectRepo.BOMB):
+            self.bombs[i, bomb.val] += 1
+        self.mana[i], self.turn[i], self.result[i] = state.mana, state.turn, state.get_end_result()
+        self.max_mana[i], self.draw_count[i] = state.game_state.max_mana, state.game_state.draw_count
+        for pile, counts in ((state.draw_pile, self.draw_pile), (state.discard_pile, self.discard_pile), (state.hand, self.hand), (state.exhaust_pile, self.exhaust_pile)):
+            for card in pile:
+                counts[i, self.kind_index[(card.name, card.upgrade_count)]] += 1
+        for e, enemy in enumerate(state.enemies):
+            self.enemy_health[i, e], self.enemy_max_health[i, e], self.enemy_block[i, e] = enemy.health, enemy.max_health, enemy.block
+            self.enemy_status[i, e] = [enemy.status_effect_state.get(status) for status in STATUSES]
+            self.intent[i, e] = self.behaviours.get_state_id(enemy, state.game_state.ascension)
+            self.alive[i, e] = not enemy.is_dead()
+
+    # columns are the card kinds and end turn, only running battles have legal actions
+    def get_legal_actions(self) -> np.ndarray:
+        legal = np.zeros((self.n, len(self.kinds) + 1), dtype=bool)
+        legal[:, :-1] = (self.hand > 0) & (self.cost[None, :] <= self.mana[:, None])
+        legal[:, -1] = True
+        legal[self.result != 0] = False
+        return legal
+
+    # one decision of every active battle (by default the running ones)
+    def step(self, policy: Callable[[BatchBattle, np.ndarray], np.ndarray]|None = None, active: np.ndarray|None = None):
+        if active is None:
+            active = self.result == 0
+        legal = self.get_legal_actions()
+        legal[~active] = False
+        choice = (policy if policy is not None else random_policy)(self, legal)
+        end_turn = len(self.kinds)
+        play = np.nonzero(active & (choice < end_turn))[0]
+        self._play_cards(play, choice[play])
+        self._end_turns(np.nonzero(active & (choice == end_turn))[0])
+        self.steps[active] += 1
+
+    # plays until every battle ended, or reached max_turns
+    def run(self, policy: Callable[[BatchBattle, np.ndarray], np.ndarray]|None = None, max_turns: int|None = None):
+        while True:
+            active = self.result == 0
+            if max_turns is not None:
+                active &= self.turn <= max_turns
+            if not active.any():
+                return
+            self.step(policy, active)
+
+    def score(self) -> np.ndarray:
+        # as BattleState.score, dead enemies are left out
+        health = (self.enemy_health * self.alive).sum(axis=1)
+        max_health = (self.enemy_max_health * self.alive).sum(axis=1)
+        return np.where(max_health > 0, 1 - health / np.maximum(max_health, 1), 1.0)
+
+    def get_health(self) -> np.ndarray:
+        return self.health / self.max_health
+
+    def _update_results(self, idx: np.ndarray):
+        self.alive[idx] &= self.enemy_health[idx] > 0
+        running = self.result[idx] == 0
+        self.result[idx] = np.where(running & (self.health[idx] <= 0), -1, np.where(running & ~self.alive[idx].any(axis=1), 1, self.result[idx]))
+
+    def _play_cards(self, idx: np.ndarray, kinds: np.ndarray):
+        if len(idx) == 0:
+            return
+        self.hand[idx, kinds] -= 1
+        self.mana[idx] -= self.cost[kinds]
+        # the attack, with the modifiers of DealAttackDamage.event in the order they are subscribed in:
+        # Vigor (on the first target only), Vulnerable, Weak, then Strength
+        alive = self.alive[idx]
+        slots = np.arange(alive.shape[1])
+        chosen = _choose(self.rng, alive)
+        targets = np.where(self.targets_all[kinds][:, None], alive, self.targets_one[kinds][:, None] & (slots[None, :] == chosen[:, None]))
+        attacks = targets & (self.hits[kinds] > 0)[:, None]
+        first = slots[None, :] == np.argmax(attacks, axis=1)[:, None]
+        status = self.status[idx]
+        amount = self.damage[kinds][:, None] + status[:, VIGOR][:, None] * first
+        amount = _modify_damage(amount, self.enemy_status[idx][:, :, VULNERABLE] > 0, (status[:, WEAK] > 0)[:, None]) + status[:, STRENGTH][:, None]
+        amount = np.where(attacks, amount * self.hits[kinds][:, None], 0)
+        self.enemy_health[idx], self.enemy_block[idx] = _get_damaged(self.enemy_health[idx], self.enemy_block[idx], amount)
+        status[:, VIGOR] = np.where(attacks.any(axis=1), 0, status[:, VIGOR])
+        self.enemy_status[idx] = np.where(targets[:, :, None], _apply_status(self.enemy_status[idx], self.target_status[kinds][:, None, :]), self.enemy_status[idx])
+        # the player
+        self.health[idx], self.block[idx] = _get_damaged(self.health[idx], self.block[idx], self.self_damage[kinds])
+        self.block[idx] = np.minimum(self.block[idx] + self.card_block[kinds], MAX_BLOCK)
+        self.status[idx] = _apply_status(status, self.self_status[kinds])
+        bombs = self.bomb[kinds] > 0
+        np.add.at(self.bombs, (idx[bombs], self.bomb[kinds][bombs]), 1)
+        self.mana[idx] = np.minimum(self.mana[idx] + self.mana_gain[kinds], MAX_MANA)
+        upgrade = idx[self.upgrades[kinds]]
+        upgrade = upgrade[self.hand[upgrade].sum(axis=1) > 0]
+        if len(upgrade) > 0:
+            upgraded = _choose(self.rng, self.hand[upgrade])
+            self.hand[upgrade, upgraded] -= 1
+            self.hand[upgrade, self.upgraded[upgraded]] += 1
+        self._draw(idx, self.card_draw[kinds])
+        # where the card goes: exhausted, gone (powers) or discarded, and the copy of cards like Anger
+        np.add.at(self.exhaust_pile, (idx, kinds), self.exhausts[kinds].astype(np.int32))
+        np.add.at(self.discard_pile, (idx, kinds), (~self.exhausts[kinds] & ~self.powers[kinds]).astype(np.int32) + self.copies[kinds].astype(np.int32))
+        self._update_results(idx)
+
+    def _end_turns(self, idx: np.ndarray):
+        if len(idx) == 0:
+            return
+        # the end of the player's side: Tolerance and Bomb, the player's statuses, the enemies' block
+        self.block[idx] += self.status[idx, TOLERANCE]
+        explosions = self.bombs[idx, 1] * BOMB_DAMAGE
+        amount = np.where(self.alive[idx], explosions[:, None], 0)
+        self.enemy_health[idx], self.enemy_block[idx] = _get_damaged(self.enemy_health[idx], self.enemy_block[idx], amount)
+        self.status[idx] = _end_turn_status(self.status[idx])
+        self.bombs[idx, :-1] = self.bombs[idx, 1:]
+        self.bombs[idx, -1] = 0
+        self.bombs[idx, 0] = 0
+        self.enemy_block[idx] = 0
+        self._update_results(idx)
+        # the enemies' side, one enemy after the other as long as the battle runs
+        tables = self.behaviours
+        for e in range(self.alive.shape[1]):
+            acting = idx[self.alive[idx, e] & (self.result[idx] == 0)]
+            if len(acting) == 0:
+                continue
+            state = self.intent[acting, e]
+            outcome = (tables.cumulative[state] <= self.rng.random(len(acting))[:, None]).sum(axis=1)
+            move = tables.outcome_move[state, outcome]
+            self.intent[acting, e] = tables.outcome_next[state, outcome]
+            enemy_status = self.enemy_status[acting, e]
+            amount = tables.move_damage[move] + enemy_status[:, VIGOR]
+            amount = _modify_damage(amount, self.status[acting, VULNERABLE] > 0, enemy_status[:, WEAK] > 0) + enemy_status[:, STRENGTH]
+            attacks = tables.move_hits[move] > 0
+            amount = np.where(attacks, amount * tables.move_hits[move], 0)
+            self.health[acting], self.block[acting] = _get_damaged(self.health[acting], self.block[acting], amount)
+            enemy_status[:, VIGOR] = np.where(attacks, 0, enemy_status[:, VIGOR])
+            self.status[acting] = _apply_status(self.status[acting], tables.move_target_status[move])
+            self.enemy_block[acting, e] = np.minimum(self.enemy_block[acting, e] + tables.move_block[move], MAX_BLOCK)
+            self.enemy_status[acting, e] = _apply_status(enemy_status, tables.move_self_status[move])
+            self._update_results(acting)
+        self.enemy_status[idx] = _end_turn_status(self.enemy_status[idx])
+        self.block[idx] = 0
+        self.discard_pile[idx] += self.hand[idx]
+        self.hand[idx] = 0
+        self._start_turn(idx)
+
+    def _start_turn(self, idx: np.ndarray):
+        self.mana[idx] = self.max_mana[idx]
+        self.turn[idx] += 1
+        self._draw(idx, self.draw_count[idx])
+
+    # draws count[i] cards for battle idx[i], one card at a time with a reshuffle when the draw pile is empty
+    def _draw(self, idx: np.ndarray, count: np.ndarray):
+        for i in range(count.max(initial=0)):
+            rows = idx[count > i]
+            empty = rows[self.draw_pile[rows].sum(axis=1) == 0]
+            self.draw_pile[empty] += self.discard_pile[empty]
+            self.discard_pile[empty] = 0
+            rows = rows[self.draw_pile[rows].sum(axis=1) > 0]
+            kinds = _choose(self.rng, self.draw_pile[rows])
+            self.draw_pile[rows, kinds] -= 1
+            self.hand[rows, kinds] += 1
+
+# The scores of random (or policy) playouts from every state, e.g. a batch of leaves of a search
+def rollout(states: list[BattleState], policy: Callable[[BatchBattle, np.ndarray], np.ndarray]|None = None, seed: int|None = None, max_turns: int|None = None) -> np.ndarray:
+    batch = BatchBattle.from_states(states, seed)
+    batch.run(policy, max_turns)
+    return batch.score()
@@ -1,18 +1,28 @@
 from __future__ import annotations
-import copy
 import os.path
 from action.game_action import GameAction
 from action.action import Action
+from action.agent_targeted_action import DealAttackDamage
 from config import MAX_MANA, Verbose
 from card import CardType
-from utility import get_unique_filename, Event
+from utility import get_unique_filename, Event, Zobrist, split_seed
+from battle_log import BattleLog
 from status_effecs import tolerance_after, bomb_after
 
 import random
 
 class BattleState:
+    # default listeners, every battle gets its own copy so that battles (and threads) share no mutable rules
     side_turn_event: Event[None, tuple[Agent, GameState, BattleState, list[Agent]]] = Event()
-    def __init__(self, game_state: GameState, *enemies: Enemy, verbose: Verbose, log_filename: str|None = None):
+    # seed picks the battle's random stream, a random seed is drawn from the random module if it is not given
+    # log_thread writes the log file from a background thread
+    def __init__(self, game_state: GameState, *enemies: Enemy, verbose: Verbose, log_filename: str|None = None, seed: int|None = None, log_thread: bool = False):
+        self.side_turn_event = BattleState.side_turn_event.copy()
+        self.attack_damage_event = DealAttackDamage.event.copy()
+        # all randomness of the battle goes through rng, which is only created when it is first used
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.splits = 0
+        self._rng: random.Random|None = None
         self.player = game_state.player
         self.enemies = [enemy for enemy in enemies]
         self.game_state = game_state
@@ -21,19 +31,109 @@ class BattleState:
         self.agent_turn_ended = False
         self.turn_phase = 0
         self.draw_pile: list[Card] = []
-        self.discard_pile: list[Card] = [copy.deepcopy(card) for card in self.game_state.deck]
+        self.discard_pile: list[Card] = [card.clone() for card in self.game_state.deck]
         self.hand: list[Card] = []
         self.exhaust_pile: list[Card] = []
+        self.pile_hash = sum([self._card_key(1, card) for card in self.discard_pile]) & Zobrist.MASK
         self.verbose = verbose
         self.log_filename = log_filename
+        self.log_thread = log_thread
+        self.logger: BattleLog|None = None
+        # a game_trace.TraceWriter that run() streams the battle to
+        self.trace: TraceWriter|None = None
+        self.journal: list[list]|None = None
 
-    def copy_undeterministic(self, nolog=True) -> BattleState:
-        battle_state_copy = copy.deepcopy(self)
-        random.shuffle(battle_state_copy.draw_pile)
+    # Every clone gets its own random stream, split from this one without drawing from it.
+    # rng, when given, is used by the clone instead (e.g. one stream shared by all copies of a search),
+    # and the clone then does not modify this state at all.
+    def clone(self, rng: random.Random|None = None) -> BattleState:
+        ret = BattleState.__new__(BattleState)
+        ret.__dict__.update(self.__dict__)
+        ret.seed = rng.getrandbits(64) if rng is not None else self.split_seed()
+        ret.splits = 0
+        ret._rng = rng
+        ret.trace = None
+        ret.game_state = self.game_state.clone()
+        ret.player = ret.game_state.player
+        ret.enemies = [enemy.clone() for enemy in self.enemies]
+        ret.draw_pile = [card.clone() for card in self.draw_pile]
+        ret.discard_pile = [card.clone() for card in self.discard_pile]
+        ret.hand = [card.clone() for card in self.hand]
+        ret.exhaust_pile = [card.clone() for card in self.exhaust_pile]
+        ret.journal = None
+        return ret
+
+    @property
+    def rng(self) -> random.Random:
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng: random.Random):
+        self._rng = rng
+
+    # seeds of independent substreams, the n-th split of a battle always gets the same seed
+    def split_seed(self) -> int:
+        self.splits += 1
+        return split_seed(self.seed, self.splits)
+
+    def split_rng(self) -> random.Random:
+        return random.Random(self.split_seed())
+
+    # While journaling, every tick_player records what it is about to change so that undo can restore it
+    def begin_journal(self):
+        self.journal = []
+
+    def end_journal(self):
+        self.journal = None
+
+    # the piles are recorded whole, card definitions only for the cards upgrade_card changes during the step
+    def _get_journal_entry(self) -> list:
+        return [
+            (self.turn, self.mana, self.agent_turn_ended, self.turn_phase, self.pile_hash, self.splits),
+            list(self.enemies),
+            [(agent, agent.get_state()) for agent in [self.player] + self.enemies],
+            (list(self.draw_pile), list(self.discard_pile), list(self.hand), list(self.exhaust_pile)),
+            [],
+            None,
+        ]
+
+    # getstate is expensive, so the generator is only saved once per step right before it is first used
+    def record_random_state(self):
+        if self.journal and self.journal[-1][-1] is None:
+            self.journal[-1][-1] = self.rng.getstate()
+
+    def undo(self):
+        assert self.journal, "There is no journaled step to undo"
+        counters, enemies, agent_states, piles, upgraded, random_state = self.journal.pop()
+        self.turn, self.mana, self.agent_turn_ended, self.turn_phase, self.pile_hash, self.splits = counters
+        self.enemies = enemies
+        for agent, agent_state in agent_states:
+            agent.set_state(agent_state)
+        self.draw_pile, self.discard_pile, self.hand, self.exhaust_pile = piles
+        for card, definition in reversed(upgraded):
+            card.definition = definition
+        if random_state is not None:
+            self.rng.setstate(random_state)
+
+    # rng, when given, is the generator of the copy, see clone
+    def copy_undeterministic(self, nolog=True, rng=None) -> BattleState:
+        battle_state_copy = self.clone(rng)
+        battle_state_copy.rng.shuffle(battle_state_copy.draw_pile)
         if nolog:
             battle_state_copy.verbose = Verbose.NO_LOG
         return battle_state_copy
     
+    # like copy_undeterministic, with the draw pile put in order (a permutation of its indices) instead of shuffled
+    def copy_determinized(self, order: list[int], nolog=True, rng=None) -> BattleState:
+        battle_state_copy = self.clone(rng)
+        draw_pile = battle_state_copy.draw_pile
+        battle_state_copy.draw_pile = [draw_pile[i] for i in order]
+        if nolog:
+            battle_state_copy.verbose = Verbose.NO_LOG
+        return battle_state_copy
+
     def get_undeterministic_repr_hash(self) -> str:
         import hashlib
         combined_hash = hashlib.sha256()
@@ -60,19 +160,61 @@ class BattleState:
             combined_hash.update(hashlib.sha256(card.__repr__().encode()).digest())
         return combined_hash.hexdigest()
 
+    # Piles are hashed as multisets: the sum of one key per (pile, card name, upgrade), kept up to date on every move
+    @staticmethod
+    def _card_key(pile_index: int, card: Card) -> int:
+        return Zobrist.key('card', pile_index, card.name, card.upgrade_count)
+
+    def _get_pile_index(self, pile: list[Card]) -> int:
+        for i, other in enumerate((self.draw_pile, self.discard_pile, self.hand, self.exhaust_pile)):
+            if pile is other:
+                return i
+        raise Exception("Pile does not belong to this battle state")
+
+    def _move_pile_hash(self, cards: list[Card], from_index: int, to_index: int):
+        for card in cards:
+            self.pile_hash += self._card_key(to_index, card) - self._card_key(from_index, card)
+        self.pile_hash &= Zobrist.MASK
+
+    def add_card(self, pile: list[Card], card: Card):
+        pile.append(card)
+        self.pile_hash = (self.pile_hash + self._card_key(self._get_pile_index(pile), card)) & Zobrist.MASK
+
+    def upgrade_card(self, card: Card, times: int = 1):
+        if self.journal:
+            self.journal[-1][-2].append((card, card.definition))
+        for i, pile in enumerate((self.draw_pile, self.discard_pile, self.hand, self.exhaust_pile)):
+            if card in pile:
+                self.pile_hash -= self._card_key(i, card)
+                card.upgrade(times)
+                self.pile_hash = (self.pile_hash + self._card_key(i, card)) & Zobrist.MASK
+                return
+        card.upgrade(times)
+
+    def get_hash(self) -> int:
+        ret = self.pile_hash + Zobrist.key('turn', self.turn, self.mana, self.agent_turn_ended, self.turn_phase)
+        for agent in [self.player] + self.enemies:
+            ret += agent.get_hash()
+        return ret & Zobrist.MASK
+
     def discard_hand(self):
+        self._move_pile_hash(self.hand, 2, 1)
         self.discard_pile += self.hand
         self.hand = []
 
     def reshuffle(self):
+        self.record_random_state()
+        self._move_pile_hash(self.discard_pile, 1, 0)
         self.draw_pile, self.discard_pile = self.draw_pile + self.discard_pile, []
-        random.shuffle(self.draw_pile)
+        self.rng.shuffle(self.draw_pile)
 
     def draw_one(self):
         if len(self.draw_pile) == 0:
             self.reshuffle()
         if len(self.draw_pile) > 0:
-            self.hand.append(self.draw_pile.pop())
+            card = self.draw_pile.pop()
+            self.hand.append(card)
+            self._move_pile_hash([card], 0, 2)
         else:
             #discard+draw+hand is empty
             pass
@@ -91,9 +233,10 @@ class BattleState:
     def play_card(self, card_index: int):
         assert card_index < len(self.hand) and card_index >= 0, "Card index {} out of range for hand {}".format(card_index, self.hand)
         card = self.hand.pop(card_index)
+        self.pile_hash = (self.pile_hash - self._card_key(2, card)) & Zobrist.MASK
         card.play(self.game_state, self)
         if not self.is_present(card) and not card.card_type == CardType.POWER:
-            self.discard_pile.append(card)
+            self.add_card(self.discard_pile, card)
 
     def is_present(self, card: Card):
         if card in self.hand:
@@ -107,37 +250,47 @@ class BattleState:
         return False
     
     def remove_card(self, card: Card):
-        if card in self.hand:
-            self.hand.remove(card)
-        if card in self.draw_pile:
-            self.draw_pile.remove(card)
-        if card in self.discard_pile:
-            self.discard_pile.remove(card)
-        if card in self.exhaust_pile:
-            self.exhaust_pile.remove(card)
+        for i, pile in enumerate((self.draw_pile, self.discard_pile, self.hand, self.exhaust_pile)):
+            if card in pile:
+                pile.remove(card)
+                self.pile_hash = (self.pile_hash - self._card_key(i, card)) & Zobrist.MASK
     
     def exhaust(self, card: Card):
         self.remove_card(card)
-        self.exhaust_pile.append(card)
+        self.add_card(self.exhaust_pile, card)
 
+    # bots choose targets with split streams (see RandomAgent) rather than the battle's generator,
+    # so a journaled step only records the split counter for them
     def get_player_card_target(self, name: str, card_list: list[Card]) -> Card:
         card = self.player.bot.choose_card_target(self, name, card_list)
-        self.log(f"Card choice {repr(card)}\n")
+        if self.trace is not None:
+            self.trace.record_target_choice(next(i for i, c in enumerate(card_list) if c is card))
+        self.log("Card choice {!r}\n", card)
         return card
     
     def get_player_agent_target(self, name: str, agent_list: list[Agent]) -> Agent:
         agent = self.player.bot.choose_agent_target(self, name, agent_list)
-        self.log(f"Agent choice {repr(agent)}\n")
+        if self.trace is not None:
+            self.trace.record_target_choice(next(i for i, a in enumerate(agent_list) if a is agent))
+        self.log("Agent choice {!r}\n", agent)
         return agent
 
-    def log(self, log: str):
+    # args are only formatted into log (with str.format) when the record is actually written
+    def log(self, log: str, *args):
         if self.verbose == Verbose.NO_LOG:
             return
+        if args:
+            log = log.format(*args)
         if self.log_filename is None:
             print(log)
-        else:
-            with open(self.log_filename, 'a') as f:
-                f.write(log)
+            return
+        if self.logger is None:
+            self.logger = BattleLog(self.log_filename, background=self.log_thread)
+        self.logger.write(log)
+
+    def close_log(self):
+        if self.logger is not None:
+            self.logger.close()
     
     def get_visualization(self):
         log = ''
@@ -176,7 +329,7 @@ class BattleState:
         self.visualize()
         agent.play(self.game_state, self)
         assert agent.prev_action is not None, "Action taken is not recorded for agent {}".format(agent.name)
-        self.log(str(agent.prev_action) + '\n')
+        self.log("{}\n", agent.prev_action)
         return True
 
     def _take_agent_turn(self, agent: Agent):
@@ -186,22 +339,26 @@ class BattleState:
         self.turn_phase += 1
     
     def _play_side(self, side: list[Agent], other_side: list[Agent]):
+        self.record_random_state()
         for agent in side:
-            BattleState.side_turn_event.broadcast_before((agent, self.game_state, self, other_side))
+            self.side_turn_event.broadcast_before((agent, self.game_state, self, other_side))
         for agent in side:
             self._take_agent_turn(agent)
         for agent in side:
-            BattleState.side_turn_event.broadcast_after((agent, self.game_state, self, other_side))
+            self.side_turn_event.broadcast_after((agent, self.game_state, self, other_side))
         for agent in side:
             agent.status_effect_state.end_turn()
         for agent in other_side:
             agent.clear_block()
 
-    def take_turn(self):
+    def start_turn(self):
         self.mana = self.game_state.max_mana
         self.turn += 1
         self.turn_phase = 0
         self.draw_hand()
+
+    def take_turn(self):
+        self.start_turn()
         self._play_side([self.player], [enemy for enemy in self.enemies])
         self._play_side([enemy for enemy in self.enemies], [self.player])
         self.discard_hand()
@@ -222,26 +379,25 @@ class BattleState:
         return self.tick_player(action.to_action(self))
 
     def tick_player(self, action: Action) -> bool:
+        if self.journal is not None:
+            self.journal.append(self._get_journal_entry())
         if self.ended():
             return False
         other_side: list[Agent] = [enemy for enemy in self.enemies]
-        BattleState.side_turn_event.broadcast_before((self.player, self.game_state, self, other_side))
+        self.side_turn_event.broadcast_before((self.player, self.game_state, self, other_side))
         action.play(self.player, self.game_state, self)
         self.enemies: list[Enemy] = [enemy for enemy in self.enemies if not enemy.is_dead()]
         if not self.agent_turn_ended:
             return True
         self.turn_phase += 1
         other_side: list[Agent] = [enemy for enemy in self.enemies]
-        BattleState.side_turn_event.broadcast_after((self.player, self.game_state, self, other_side))
+        self.side_turn_event.broadcast_after((self.player, self.game_state, self, other_side))
         self.player.status_effect_state.end_turn()
         for enemy in self.enemies:
             enemy.clear_block()
         self._play_side([enemy for enemy in self.enemies], [self.player])
         self.discard_hand()
-        self.mana = self.game_state.max_mana
-        self.turn += 1
-        self.turn_phase = 0
-        self.draw_hand()
+        self.start_turn()
         self.agent_turn_ended = False
         return True
         
@@ -272,17 +428,25 @@ class BattleState:
     def initiate_log(self):
         if self.verbose == Verbose.LOG and self.log_filename is not None:
             self.log_filename = get_unique_filename(self.log_filename, 'log')
-        self.log(f'version {1.0}\n')
+        self.log('version {}\n', 1.0)
         for card in self.game_state.deck:
-            self.log(f'{card}\n')
+            self.log('{}\n', card)
     
+    # the log is written out even when a bot or the engine raises, it is the log needed to debug that
     def run(self):
-        self.initiate_log()
-        while not self.ended():
-            self.take_turn()
-        self.player.clean_up()
-        self.visualize()
-        self.log("WIN\n" if self.get_end_result() == 1 else "LOSE\n")
+        try:
+            self.initiate_log()
+            if self.trace is not None:
+                self.trace.begin_game(self)
+            while not self.ended():
+                self.take_turn()
+            self.player.clean_up()
+            self.visualize()
+            self.log("WIN\n" if self.get_end_result() == 1 else "LOSE\n")
+        finally:
+            self.close_log()
+        if self.trace is not None:
+            self.trace.end_game(self)
 
 BattleState.side_turn_event.subscribe_after(tolerance_after)
 BattleState.side_turn_event.subscribe_after(bomb_after)
\ No newline at end of file
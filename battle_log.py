@@ -0,0 +1,72 @@
+from __future__ import annotations
+import atexit
+import queue
+import threading
+
+# The log file of a battle. Records are collected in memory and appended to the file in chunks,
+# once buffer_size characters are waiting and whenever the log is flushed or closed (at the end of the battle).
+# A log with records waiting is also closed at exit, for battles that raised or were stepped without BattleState.run.
+# With background set, the chunks are appended by a writer thread, so the battle never waits on the disk.
+class BattleLog:
+    def __init__(self, filename: str, buffer_size: int = 1 << 16, background: bool = False):
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.background = background
+        self.buffer: list[str] = []
+        self.buffered = 0
+        self.queue: queue.Queue[str|None]|None = None
+        self.writer: threading.Thread|None = None
+        self.closed_at_exit = False
+
+    # copies sent to other processes start empty and get their own writer when they need one
+    def __getstate__(self):
+        return {'filename': self.filename, 'buffer_size': self.buffer_size, 'background': self.background}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def write(self, text: str):
+        if not self.closed_at_exit:
+            atexit.register(self.close)
+            self.closed_at_exit = True
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        chunk = ''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        if not self.background:
+            self._append(chunk)
+            return
+        if self.writer is None:
+            self.queue = queue.Queue()
+            self.writer = threading.Thread(target=self._run_writer, args=(self.queue,), daemon=True)
+            self.writer.start()
+        self.queue.put(chunk)
+
+    def close(self):
+        if self.closed_at_exit:
+            atexit.unregister(self.close)
+            self.closed_at_exit = False
+        self.flush()
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+            self.queue = None
+
+    def _append(self, chunk: str):
+        with open(self.filename, 'a') as f:
+            f.write(chunk)
+
+    def _run_writer(self, chunks: queue.Queue[str|None]):
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            self._append(chunk)
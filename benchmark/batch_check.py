@@ -0,0 +1,95 @@
+from __future__ import annotations
+import argparse
+import math
+import random
+import sys
+import time
+import numpy as np
+import agent
+from battle import BattleState
+from batch_sim import BatchBattle
+from card import CardRepo
+from config import Character, Verbose
+from game import GameState
+from ggpa.random_bot import RandomAgent
+from main import get_scenario
+from benchmark.clone_bench import SCENARIOS
+
+# player health, deck and enemies: the scenarios of main.py and battles that use the other cards and enemies
+CONFIGS = {scenario: (get_scenario(scenario)[0], get_scenario(scenario)[1], [get_scenario(scenario)[2]]) for scenario in SCENARIOS}
+CONFIGS.update({
+    "tolerate": (40, ["Strike", "Defend", "Defend", "Defend", "Tolerate"], ["JawWorm"]),
+    "bomb": (40, ["Strike"] * 5 + ["Defend"] * 4 + ["Bomb"], ["JawWorm"]),
+    "slimes": (30, ["Strike", "Strike", "Defend", "Defend", "Cleave", "Anger", "Thunderclap", "UpperCut", "Flex", "Batter"], ["AcidSlimeSmall", "SpikeSlimeSmall"]),
+    "goblins": (50, ["Strike", "Strike", "Defend", "Defend", "Stimulate", "SeeingRed", "BloodLetting", "ShrugItOff", "Impervious", "Suffer"], ["Goblin", "Leech"]),
+    "armament": (60, ["Strike", "Strike", "Defend", "Armaments", "Armaments", "SearingBlow", "PommelStrike", "Inflame"], ["HobGoblin"]),
+})
+METRICS = ["score", "win", "turns", "health"]
+
+def make_battle_state(config: str, seed: int) -> BattleState:
+    health, deck, enemies = CONFIGS[config]
+    game_state = GameState(Character.IRON_CLAD, RandomAgent(), 0, health)
+    game_state.set_deck(CardRepo.make_deck(deck))
+    rng = random.Random(seed)
+    return BattleState(game_state, *[agent.make_enemy(enemy, game_state, rng) for enemy in enemies], verbose=Verbose.NO_LOG, seed=rng.getrandbits(64))
+
+# random playouts with the engine, uniform over get_actions like Sampler.rollout
+def play_engine(config: str, seeds: range) -> tuple[dict[str, np.ndarray], float]:
+    results = {metric: [] for metric in METRICS}
+    start = time.perf_counter()
+    for seed in seeds:
+        state = make_battle_state(config, seed)
+        state.start_turn()
+        while not state.ended():
+            state.step(state.rng.choice(state.get_actions()))
+        results["score"].append(state.score())
+        results["win"].append(state.get_end_result() == 1)
+        results["turns"].append(state.turn)
+        results["health"].append(state.health())
+    return {metric: np.array(values, dtype=float) for metric, values in results.items()}, time.perf_counter() - start
+
+def play_batch(config: str, seeds: range) -> tuple[dict[str, np.ndarray], float]:
+    start = time.perf_counter()
+    batch = BatchBattle.from_states([make_battle_state(config, seed) for seed in seeds], seeds.start)
+    batch.run()
+    elapsed = time.perf_counter() - start
+    return {
+        "score": batch.score(),
+        "win": (batch.result == 1).astype(float),
+        "turns": batch.turn.astype(float),
+        "health": batch.get_health(),
+    }, elapsed
+
+# Welch's statistic for the difference of the means, about standard normal when both agree
+def get_z(a: np.ndarray, b: np.ndarray) -> float:
+    error = math.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+    difference = a.mean() - b.mean()
+    if error == 0:
+        return 0.0 if difference == 0 else math.inf
+    return difference / error
+
+def main(configs: list[str], games: int, threshold: float) -> int:
+    failures = []
+    print(f"{'config':<10} {'metric':<7} {'engine':>9} {'batch':>9} {'z':>7}")
+    for config in configs:
+        # independent battles on both sides, the batch ones come from other seeds
+        engine, engine_time = play_engine(config, range(games))
+        batch, batch_time = play_batch(config, range(games, 2 * games))
+        for metric in METRICS:
+            z = get_z(engine[metric], batch[metric])
+            flag = " MISMATCH" if abs(z) > threshold else ""
+            if flag:
+                failures.append((config, metric))
+            print(f"{config:<10} {metric:<7} {engine[metric].mean():>9.3f} {batch[metric].mean():>9.3f} {z:>7.2f}{flag}")
+        print(f"{config:<10} playouts/s: engine {games / engine_time:.0f}, batch {games / batch_time:.0f} ({engine_time / batch_time:.1f}x)")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='batch_check',
+                    description='Compares random playouts of the batch simulator with those of BattleState')
+    parser.add_argument('-c', '--config', nargs='*', default=list(CONFIGS.keys()), choices=list(CONFIGS.keys()))
+    parser.add_argument('-g', '--games', type=int, default=2000, help="playouts per side and config")
+    parser.add_argument('-t', '--threshold', type=float, default=2.0, help="largest |z| of a metric that counts as agreeing")
+    args = parser.parse_args()
+    sys.exit(main(args.config, args.games, args.threshold))
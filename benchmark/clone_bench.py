@@ -0,0 +1,102 @@
+from __future__ import annotations
+import argparse
+import copy
+import random
+import time
+from config import Verbose
+from ggpa.random_bot import RandomAgent
+from main import make_battle_state
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from battle import BattleState
+
+SCENARIOS = ["intro", "offerings", "lowhp", "giant", "challenge", "boss"]
+
+# copy_undeterministic as it was before BattleState.clone, kept as the baseline
+def deepcopy_undeterministic(battle_state: BattleState) -> BattleState:
+    battle_state_copy = copy.deepcopy(battle_state)
+    battle_state_copy.seed = battle_state.split_seed()
+    battle_state_copy.splits = 0
+    battle_state_copy.rng = random.Random(battle_state_copy.seed)
+    battle_state_copy.rng.shuffle(battle_state_copy.draw_pile)
+    battle_state_copy.verbose = Verbose.NO_LOG
+    return battle_state_copy
+
+def clone_undeterministic(battle_state: BattleState) -> BattleState:
+    return battle_state.copy_undeterministic()
+
+def get_playout_states(scenario: str, seed: int) -> list[BattleState]:
+    random.seed(seed)
+    battle_state = make_battle_state(scenario, RandomAgent(), seed=seed)
+    battle_state.start_turn()
+    states = [battle_state.clone()]
+    while not battle_state.ended():
+        battle_state.step(random.choice(battle_state.get_actions()))
+        states.append(battle_state.clone())
+    return states
+
+def measure(copy_func, states: list[BattleState], count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        copy_func(states[i % len(states)])
+    return count / (time.perf_counter() - start)
+
+# make/unmake: one step and its undo on the same state, against the clone+step it replaces
+def measure_undo(states: list[BattleState], count: int) -> float:
+    states = [state.clone() for state in states if not state.ended()]
+    for state in states:
+        state.begin_journal()
+    actions = [random.choice(state.get_actions()) for state in states]
+    start = time.perf_counter()
+    for i in range(count):
+        state = states[i % len(states)]
+        state.step(actions[i % len(states)])
+        state.undo()
+    return count / (time.perf_counter() - start)
+
+def measure_clone_step(states: list[BattleState], count: int) -> float:
+    states = [state for state in states if not state.ended()]
+    actions = [random.choice(state.get_actions()) for state in states]
+    start = time.perf_counter()
+    for i in range(count):
+        states[i % len(states)].clone().step(actions[i % len(states)])
+    return count / (time.perf_counter() - start)
+
+def get_trajectory(copy_func, battle_state: BattleState, seed: int) -> list[str]:
+    random.seed(seed)
+    state = copy_func(battle_state)
+    trajectory = [state.get_visualization()]
+    while not state.ended():
+        state.step(random.choice(state.get_actions()))
+        trajectory.append(state.get_visualization())
+        state = copy_func(state)
+    return trajectory
+
+def check(scenario: str, seeds: int) -> bool:
+    for seed in range(seeds):
+        for state in get_playout_states(scenario, seed)[::4]:
+            # both copies start from the same split counter
+            if get_trajectory(deepcopy_undeterministic, copy.deepcopy(state), seed) != get_trajectory(clone_undeterministic, copy.deepcopy(state), seed):
+                print(f"{scenario}: trajectories differ for seed {seed}")
+                return False
+    return True
+
+def main(scenarios: list[str], count: int, seeds: int):
+    print(f"{'scenario':<10} {'deepcopy/s':>12} {'clone/s':>12} {'speedup':>8} {'clone+step/s':>13} {'step+undo/s':>12} {'ratio':>6}  identical")
+    for scenario in scenarios:
+        states = [state for seed in range(seeds) for state in get_playout_states(scenario, seed)]
+        before = measure(deepcopy_undeterministic, states, count)
+        after = measure(clone_undeterministic, states, count)
+        clone_step = measure_clone_step(states, count)
+        undo = measure_undo(states, count)
+        print(f"{scenario:<10} {before:>12.0f} {after:>12.0f} {after/before:>7.1f}x {clone_step:>13.0f} {undo:>12.0f} {undo/clone_step:>5.2f}x  {check(scenario, seeds)}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='clone_bench',
+                    description='Compares BattleState.clone against copy.deepcopy')
+    parser.add_argument('-s', '--scenario', nargs='*', default=SCENARIOS)
+    parser.add_argument('-c', '--count', type=int, default=5000)
+    parser.add_argument('--seeds', type=int, default=5)
+    args = parser.parse_args()
+    main(args.scenario, args.count, args.seeds)
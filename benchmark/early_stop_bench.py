@@ -0,0 +1,48 @@
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ggpa.mcts_bot import MCTSAgent
+from ggpa.open_loop_bot import OpenLoopAgent
+from main import make_battle_state
+from benchmark.clone_bench import SCENARIOS
+
+def make_bot(bot: str, iterations: int, early_stop: float):
+    if bot == "mcts":
+        return MCTSAgent(iterations, False, 0.5, early_stop=early_stop)
+    return OpenLoopAgent(iterations, False, 0.5, early_stop=early_stop)
+
+# score, CPU time and the iterations run over all searched decisions of one game
+def play_game(bot: str, iterations: int, early_stop: float, scenario: str, seed: int) -> tuple[float, float, int, int]:
+    player = make_bot(bot, iterations, early_stop)
+    battle_state = make_battle_state(scenario, player, seed=seed)
+    start = time.process_time()
+    battle_state.run()
+    return battle_state.score(), time.process_time() - start, sum(player.metadata['iterations']), len(player.metadata['iterations'])
+
+# the same games (seeds) with every early stop, 0 always runs all iterations
+def main(scenarios: list[str], bot: str, early_stops: list[float], iterations: int, games: int, jobs: int):
+    print(f"{bot} with at most {iterations} iterations")
+    print(f"{'scenario':<10} {'early stop':>10} {'CPU s/game':>11} {'iterations/decision':>20} {'saved':>7} {'avg score':>10} {'win rate':>9}")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for scenario in scenarios:
+            for early_stop in early_stops:
+                results = list(pool.map(play_game, *zip(*[(bot, iterations, early_stop, scenario, seed) for seed in range(games)])))
+                scores, times, used, decisions = zip(*results)
+                per_decision = sum(used) / max(sum(decisions), 1)
+                wins = sum(score > 0.999 for score in scores)
+                print(f"{scenario:<10} {early_stop:>10} {sum(times)/games:>11.2f} {per_decision:>20.1f} {(1 - per_decision / iterations) * 100:>6.1f}% {sum(scores)/games:>10.3f} {wins*100/games:>8.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='early_stop_bench',
+                    description='CPU time saved and playing strength of statistical early stopping in MCTS')
+    parser.add_argument('-s', '--scenario', nargs='*', default=SCENARIOS)
+    parser.add_argument('-b', '--bot', choices=["mcts", "openloop"], default="mcts")
+    parser.add_argument('-z', '--early-stop', nargs='*', type=float, default=[0, 1.0, 1.96, 3.0], help="standard errors, 0 disables")
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    parser.add_argument('-g', '--games', type=int, default=10)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.scenario, args.bot, args.early_stop, args.iterations, args.games, args.jobs)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import argparse
+import json
+import platform
+import sys
+import time
+from ggpa.random_bot import RandomAgent
+from main import make_battle_state, get_scenario_deck
+from encoding import StateEncoder
+from benchmark.clone_bench import SCENARIOS
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from battle import BattleState
+
+METRICS = ["step/s", "playouts/s", "copy_undeterministic/s", "get_actions/s", "encode/s"]
+
+# Random playouts from the start of the battle; only the time spent in step counts towards step/s.
+# Returns the rates and every state that was visited, for the other measurements.
+def measure_playouts(scenario: str, seeds: int, playouts: int) -> tuple[float, float, list[BattleState]]:
+    initial_states = []
+    for seed in range(seeds):
+        battle_state = make_battle_state(scenario, RandomAgent(), seed=seed)
+        battle_state.start_turn()
+        initial_states.append(battle_state)
+    visited = []
+    steps = 0
+    step_time = 0
+    start = time.perf_counter()
+    for i in range(playouts):
+        state = initial_states[i % seeds].clone()
+        while not state.ended():
+            action = state.rng.choice(state.get_actions())
+            if i < seeds:
+                visited.append(state.clone())
+            step_start = time.perf_counter()
+            state.step(action)
+            step_time += time.perf_counter() - step_start
+            steps += 1
+    elapsed = time.perf_counter() - start
+    return steps / step_time, playouts / elapsed, visited
+
+def measure_copy(states: list[BattleState], count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        states[i % len(states)].copy_undeterministic()
+    return count / (time.perf_counter() - start)
+
+def measure_get_actions(states: list[BattleState], count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        states[i % len(states)].get_actions()
+    return count / (time.perf_counter() - start)
+
+# encodings written into one reused buffer, as for a batch of leaves
+def measure_encode(scenario: str, states: list[BattleState], count: int) -> float:
+    encoder = StateEncoder.from_deck(get_scenario_deck(scenario))
+    buffer = encoder.get_buffer(len(states))
+    batches = max(count // len(states), 1)
+    start = time.perf_counter()
+    for _ in range(batches):
+        encoder.encode_batch(states, buffer)
+    return batches * len(states) / (time.perf_counter() - start)
+
+# the best of several repeats, the slower ones are mostly noise from the rest of the machine
+def run(scenarios: list[str], seeds: int, playouts: int, count: int, repeat: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for scenario in scenarios:
+        best = {metric: 0.0 for metric in METRICS}
+        for _ in range(repeat):
+            step_rate, playout_rate, states = measure_playouts(scenario, seeds, playouts)
+            rates = [step_rate, playout_rate, measure_copy(states, count), measure_get_actions(states, count), measure_encode(scenario, states, count)]
+            for metric, rate in zip(METRICS, rates):
+                best[metric] = max(best[metric], rate)
+        results[scenario] = best
+    return results
+
+# metrics that are slower than the baseline by more than threshold (a fraction)
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) -> list[tuple[str, str, float]]:
+    regressions = []
+    for scenario, rates in results.items():
+        for metric, rate in rates.items():
+            base = baseline.get(scenario, {}).get(metric)
+            if base and rate < base * (1 - threshold):
+                regressions.append((scenario, metric, rate / base - 1))
+    return regressions
+
+def print_results(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]]|None):
+    print(f"{'scenario':<10} " + " ".join(f"{metric:>24}" for metric in METRICS))
+    for scenario, rates in results.items():
+        cells = []
+        for metric in METRICS:
+            cell = f"{rates[metric]:.0f}"
+            base = baseline.get(scenario, {}).get(metric) if baseline is not None else None
+            if base:
+                cell += f" ({(rates[metric] / base - 1) * 100:+.1f}%)"
+            cells.append(f"{cell:>24}")
+        print(f"{scenario:<10} " + " ".join(cells))
+
+def main(scenarios: list[str], seeds: int, playouts: int, count: int, repeat: int, output: str|None, baseline_file: str|None, threshold: float) -> int:
+    results = run(scenarios, seeds, playouts, count, repeat)
+    baseline = None
+    if baseline_file is not None:
+        with open(baseline_file) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'settings': {'seeds': seeds, 'playouts': playouts, 'count': count, 'repeat': repeat},
+                'results': results,
+            }, f, indent=2)
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, threshold)
+    for scenario, metric, change in regressions:
+        print(f"REGRESSION {scenario} {metric}: {change * 100:.1f}% (threshold {threshold * 100:.0f}%)")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='engine_bench',
+                    description='Simulation throughput of the battle engine on every scenario')
+    parser.add_argument('-s', '--scenario', nargs='*', default=SCENARIOS)
+    parser.add_argument('--seeds', type=int, default=5, help="number of different battles per scenario")
+    parser.add_argument('-p', '--playouts', type=int, default=200)
+    parser.add_argument('-c', '--count', type=int, default=5000, help="calls per copy_undeterministic, get_actions and encode measurement")
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('-o', '--output', help="write the results to this JSON file")
+    parser.add_argument('-b', '--baseline', help="JSON file of an earlier run to compare against")
+    parser.add_argument('-t', '--threshold', type=float, default=0.1, help="slowdown (fraction) reported as a regression")
+    args = parser.parse_args()
+    sys.exit(main(args.scenario, args.seeds, args.playouts, args.count, args.repeat, args.output, args.baseline, args.threshold))
@@ -0,0 +1,37 @@
+from __future__ import annotations
+import argparse
+import os
+import time
+import numpy as np
+from vec_env import VecBattleEnv
+
+# environment steps per second of VecBattleEnv with random legal actions, in process and with worker processes
+def measure(scenario: str, num_envs: int, workers: int, steps: int, seed: int) -> tuple[float, int]:
+    rng = np.random.default_rng(seed)
+    with VecBattleEnv(scenario, num_envs, workers) as env:
+        _, mask = env.reset(seed)
+        episodes = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            choice = (np.cumsum(mask, axis=1) <= (rng.random(num_envs) * mask.sum(axis=1)).astype(int)[:, None]).sum(axis=1)
+            _, mask, _, done, _ = env.step(choice)
+            episodes += int(done.sum())
+        return num_envs * steps / (time.perf_counter() - start), episodes
+
+def main(scenario: str, num_envs: int, workers: list[int], steps: int, seed: int):
+    print(f"{'workers':>7} {'env steps/s':>12} {'episodes':>9}")
+    for worker_count in workers:
+        rate, episodes = measure(scenario, num_envs, worker_count, steps, seed)
+        print(f"{worker_count:>7} {rate:>12.0f} {episodes:>9}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='env_bench',
+                    description='Throughput of the vectorized battle environment')
+    parser.add_argument('-s', '--scenario', default="intro")
+    parser.add_argument('-n', '--num-envs', type=int, default=256)
+    parser.add_argument('-w', '--workers', type=int, nargs='*', default=[0, os.cpu_count()], help="worker process counts to compare, 0 steps in process")
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args.scenario, args.num_envs, args.workers, args.steps, args.seed)
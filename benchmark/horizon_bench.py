@@ -0,0 +1,76 @@
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ggpa.evaluation import RolloutHorizon, EVALUATORS
+from ggpa.mcts_bot import MCTSAgent
+from ggpa.sampling_bot import SamplingAgent
+from main import make_battle_state
+from benchmark.parallel_bench import get_decision_states
+
+# turns and steps of every rollout horizon, full plays the rollouts to the end of the battle
+# and leaf evaluates the state a rollout starts in
+HORIZONS = {
+    "full": (None, None),
+    "4 turns": (4, None),
+    "2 turns": (2, None),
+    "1 turn": (1, None),
+    "20 steps": (None, 20),
+    "5 steps": (None, 5),
+    "leaf": (0, None),
+}
+
+def make_horizon(name: str, evaluator: str) -> RolloutHorizon|None:
+    turns, steps = HORIZONS[name]
+    if turns is None and steps is None:
+        return None
+    return RolloutHorizon(turns, steps, EVALUATORS[evaluator])
+
+def make_bot(bot: str, iterations: int, horizon: RolloutHorizon|None):
+    if bot == "mcts":
+        return MCTSAgent(iterations, False, 0.5, reuse_tree=False, horizon=horizon)
+    return SamplingAgent(iterations, False, horizon)
+
+# search speed on the same decision states for every horizon
+def measure(bot: str, horizon: RolloutHorizon|None, states, iterations: int) -> float:
+    agent = make_bot(bot, iterations, horizon)
+    start = time.perf_counter()
+    for state in states:
+        state.player.bot = agent
+        agent.choose_card(state.game_state, state.copy_undeterministic())
+    return iterations * len(states) / (time.perf_counter() - start)
+
+def play_game(bot: str, iterations: int, horizon: RolloutHorizon|None, scenario: str, seed: int) -> float:
+    battle_state = make_battle_state(scenario, make_bot(bot, iterations, horizon), seed=seed)
+    battle_state.run()
+    return battle_state.score()
+
+def main(scenario: str, bot: str, horizons: list[str], evaluator: str, iterations: int, decisions: int, games: int, jobs: int):
+    states = get_decision_states(scenario, 3, decisions)
+    print(f"{scenario}, {bot} with {iterations} iterations, {evaluator} evaluator")
+    print(f"{'horizon':<9} {'iterations/s':>13} {'speedup':>8} {'avg score':>10} {'win rate':>9}")
+    base = None
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for name in horizons:
+            horizon = make_horizon(name, evaluator)
+            rate = measure(bot, horizon, states, iterations)
+            base = base or rate
+            scores = list(pool.map(play_game, *zip(*[(bot, iterations, horizon, scenario, seed) for seed in range(games)])))
+            wins = sum(score > 0.999 for score in scores)
+            print(f"{name:<9} {rate:>13.0f} {rate/base:>7.1f}x {sum(scores)/games:>10.3f} {wins*100/games:>8.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='horizon_bench',
+                    description='Search speed and playing strength of depth-limited rollouts')
+    parser.add_argument('-s', '--scenario', default="boss")
+    parser.add_argument('-b', '--bot', choices=["mcts", "sampling"], default="mcts")
+    parser.add_argument('--horizon', nargs='*', default=list(HORIZONS.keys()), choices=list(HORIZONS.keys()))
+    parser.add_argument('-e', '--evaluator', choices=list(EVALUATORS.keys()), default="heuristic")
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('-d', '--decisions', type=int, default=10, help="decision states the search speed is measured on")
+    parser.add_argument('-g', '--games', type=int, default=20, help="games played with every horizon")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.scenario, args.bot, args.horizon, args.evaluator, args.iterations, args.decisions, args.games, args.jobs)
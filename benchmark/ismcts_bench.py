@@ -0,0 +1,57 @@
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ggpa.mcts_bot import MCTSAgent
+from ggpa.open_loop_bot import OpenLoopAgent
+from main import make_battle_state
+from benchmark.parallel_bench import get_decision_states
+
+def make_bot(bot: str, iterations: int, determinizations: int):
+    if bot == "mcts":
+        return MCTSAgent(iterations, False, 0.5, reuse_tree=False, determinizations=determinizations)
+    return OpenLoopAgent(iterations, False, 0.5, reuse_tree=False, determinizations=determinizations)
+
+# search speed on the same decision states
+def measure(bot: str, determinizations: int, states, iterations: int) -> float:
+    agent = make_bot(bot, iterations, determinizations)
+    start = time.perf_counter()
+    for state in states:
+        state.player.bot = agent
+        agent.choose_card(state.game_state, state.copy_undeterministic())
+    return iterations * len(states) / (time.perf_counter() - start)
+
+def play_game(bot: str, iterations: int, determinizations: int, scenario: str, seed: int) -> float:
+    battle_state = make_battle_state(scenario, make_bot(bot, iterations, determinizations), seed=seed)
+    battle_state.run()
+    return battle_state.score()
+
+# every pool size of determinizations against a fresh shuffle per iteration (0)
+def main(scenario: str, bots: list[str], pools: list[int], iterations: int, decisions: int, games: int, jobs: int):
+    states = get_decision_states(scenario, 3, decisions)
+    print(f"{scenario} with {iterations} iterations")
+    print(f"{'bot':<9} {'pool':>5} {'iterations/s':>13} {'speedup':>8} {'avg score':>10} {'win rate':>9}")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for bot in bots:
+            base = None
+            for determinizations in pools:
+                rate = measure(bot, determinizations, states, iterations)
+                base = base or rate
+                scores = list(pool.map(play_game, *zip(*[(bot, iterations, determinizations, scenario, seed) for seed in range(games)])))
+                wins = sum(score > 0.999 for score in scores)
+                print(f"{bot:<9} {determinizations:>5} {rate:>13.0f} {rate/base:>7.2f}x {sum(scores)/games:>10.3f} {wins*100/games:>8.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='ismcts_bench',
+                    description='Search speed and playing strength of MCTS with a shared pool of determinizations')
+    parser.add_argument('-s', '--scenario', default="boss")
+    parser.add_argument('-b', '--bot', nargs='*', choices=["mcts", "openloop"], default=["mcts", "openloop"])
+    parser.add_argument('-k', '--pool', nargs='*', type=int, default=[0, 1, 4, 16, 64], help="pool sizes, 0 shuffles a copy every iteration")
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('-d', '--decisions', type=int, default=10, help="decision states the search speed is measured on")
+    parser.add_argument('-g', '--games', type=int, default=20, help="games played with every pool size")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.scenario, args.bot, args.pool, args.iterations, args.decisions, args.games, args.jobs)
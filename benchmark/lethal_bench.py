@@ -0,0 +1,46 @@
+from __future__ import annotations
+import argparse
+import time
+from ggpa.mcts_bot import MCTSAgent
+from ggpa.sampling_bot import SamplingAgent
+from main import make_battle_state
+from benchmark.clone_bench import SCENARIOS
+
+def make_bot(bot: str, iterations: int, lethal: bool):
+    if bot == "mcts":
+        return MCTSAgent(iterations, False, 0.5, lethal=lethal)
+    return SamplingAgent(iterations, False, lethal=lethal)
+
+# games with and without the lethal solver, with how often it found a win in decisions and rollout turns
+def main(scenarios: list[str], bot: str, iterations: int, games: int):
+    print(f"{'scenario':<10} {'lethal':<6} {'s/game':>7} {'avg score':>10} {'win rate':>9} {'decisions fired':>16} {'rollout turns fired':>20}")
+    for scenario in scenarios:
+        for lethal in [False, True]:
+            scores = []
+            fired = {'decision': 0, 'rollout': 0}
+            checks = {'decision': 0, 'rollout': 0}
+            start = time.perf_counter()
+            for seed in range(games):
+                player = make_bot(bot, iterations, lethal)
+                battle_state = make_battle_state(scenario, player, seed=seed)
+                battle_state.run()
+                scores.append(battle_state.score())
+                if player.lethal is not None:
+                    for caller in fired:
+                        fired[caller] += player.lethal.fired[caller]
+                        checks[caller] += player.lethal.checks[caller]
+            elapsed = (time.perf_counter() - start) / games
+            wins = sum(score > 0.999 for score in scores)
+            rates = [f"{fired[caller]}/{checks[caller]}" if lethal else "-" for caller in ['decision', 'rollout']]
+            print(f"{scenario:<10} {str(lethal):<6} {elapsed:>7.2f} {sum(scores)/games:>10.3f} {wins*100/games:>8.1f}% {rates[0]:>16} {rates[1]:>20}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='lethal_bench',
+                    description='Time and strength of a bot with and without the lethal solver')
+    parser.add_argument('-s', '--scenario', nargs='*', default=SCENARIOS)
+    parser.add_argument('-b', '--bot', choices=["mcts", "sampling"], default="mcts")
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('-g', '--games', type=int, default=10)
+    args = parser.parse_args()
+    main(args.scenario, args.bot, args.iterations, args.games)
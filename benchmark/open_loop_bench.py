@@ -0,0 +1,65 @@
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ggpa.mcts_bot import MCTSAgent
+from ggpa.open_loop_bot import OpenLoopAgent
+from main import make_battle_state
+from benchmark.parallel_bench import get_decision_states
+from benchmark.clone_bench import SCENARIOS
+
+BOTS = ["mcts", "openloop"]
+
+def make_bot(bot: str, iterations: int):
+    if bot == "mcts":
+        return MCTSAgent(iterations, False, 0.5, reuse_tree=False)
+    return OpenLoopAgent(iterations, False, 0.5, reuse_tree=False)
+
+# search speed on the same decision states, with the share of the iterations that reached backpropagation:
+# TreeNode.select returns without a result when it reaches the end of the battle in the tree, or when UCB picks
+# an action the iteration's draws did not make available
+def measure(bot: str, states, iterations: int) -> tuple[float, float]:
+    agent = make_bot(bot, iterations)
+    roots = []
+    make_root = agent._make_root
+    def recording_make_root():
+        roots.append(make_root())
+        return roots[-1]
+    agent._make_root = recording_make_root
+    start = time.perf_counter()
+    for state in states:
+        state.player.bot = agent
+        agent.choose_card(state.game_state, state.copy_undeterministic())
+    elapsed = time.perf_counter() - start
+    counted = sum(root.stats.visits for root in roots) / (len(roots) * iterations) if roots else 0
+    return iterations * len(states) / elapsed, counted
+
+def play_game(bot: str, iterations: int, scenario: str, seed: int) -> float:
+    battle_state = make_battle_state(scenario, make_bot(bot, iterations), seed=seed)
+    battle_state.run()
+    return battle_state.score()
+
+def main(scenarios: list[str], bots: list[str], iterations: int, decisions: int, games: int, jobs: int):
+    print(f"{'scenario':<10} {'bot':<9} {'iterations/s':>13} {'counted':>8} {'counted/s':>10} {'avg score':>10} {'win rate':>9}")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for scenario in scenarios:
+            states = get_decision_states(scenario, 3, decisions)
+            for bot in bots:
+                rate, counted = measure(bot, states, iterations)
+                scores = list(pool.map(play_game, *zip(*[(bot, iterations, scenario, seed) for seed in range(games)])))
+                wins = sum(score > 0.999 for score in scores)
+                print(f"{scenario:<10} {bot:<9} {rate:>13.0f} {counted*100:>7.1f}% {rate*counted:>10.0f} {sum(scores)/games:>10.3f} {wins*100/games:>8.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='open_loop_bench',
+                    description='Search speed and playing strength of open-loop MCTS against MCTS')
+    parser.add_argument('-s', '--scenario', nargs='*', default=SCENARIOS)
+    parser.add_argument('-b', '--bot', nargs='*', choices=BOTS, default=BOTS)
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('-d', '--decisions', type=int, default=10, help="decision states the search speed is measured on")
+    parser.add_argument('-g', '--games', type=int, default=20, help="games played with every bot")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.scenario, args.bot, args.iterations, args.decisions, args.games, args.jobs)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+import argparse
+import os
+import random
+import time
+from ggpa.mcts_bot import MCTSAgent
+from benchmark.clone_bench import get_playout_states
+
+def get_decision_states(scenario: str, seeds: int, count: int):
+    states = [state for seed in range(seeds) for state in get_playout_states(scenario, seed) if len(state.get_actions()) > 1]
+    random.seed(0)
+    return random.sample(states, min(count, len(states)))
+
+def measure(workers: int, states, iterations: int) -> float:
+    agent = MCTSAgent(iterations, False, 0.5, reuse_tree=False, workers=workers)
+    for state in states:
+        state.player.bot = agent
+    # the first decision starts the pool and is not timed
+    agent.choose_card(states[0].game_state, states[0].copy_undeterministic())
+    start = time.perf_counter()
+    for state in states:
+        agent.choose_card(state.game_state, state.copy_undeterministic())
+    elapsed = time.perf_counter() - start
+    agent.close()
+    return iterations * len(states) / elapsed
+
+def main(scenario: str, iterations: int, decisions: int, max_workers: int):
+    states = get_decision_states(scenario, 3, decisions)
+    print(f"{'workers':>7} {'iterations/s':>13} {'speedup':>8} {'efficiency':>11}")
+    base = None
+    workers = 1
+    while workers <= max_workers:
+        rate = measure(workers, states, iterations)
+        base = base or rate
+        print(f"{workers:>7} {rate:>13.0f} {rate/base:>7.2f}x {rate/base/workers*100:>10.1f}%")
+        workers *= 2
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='parallel_bench',
+                    description='Speedup curve of root-parallel MCTS')
+    parser.add_argument('-s', '--scenario', default="boss")
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    parser.add_argument('-d', '--decisions', type=int, default=10)
+    parser.add_argument('-w', '--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.scenario, args.iterations, args.decisions, args.max_workers)
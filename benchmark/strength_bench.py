@@ -0,0 +1,146 @@
+from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ggpa.ggpa import GGPA
+from ggpa.mcts_bot import MCTSAgent
+from ggpa.sampling_bot import SamplingAgent
+from ggpa.backtrack import BacktrackBot
+from ggpa.random_bot import RandomAgent
+from main import make_battle_state
+from benchmark.clone_bench import SCENARIOS
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from game import GameState
+    from battle import BattleState
+    from agent import Agent
+    from card import Card
+
+# budget is the iteration count of MCTS and Sampling and the search depth of Backtrack
+BUDGETS = {
+    "mcts": [10, 25, 50, 100, 200],
+    "sampling": [10, 25, 50, 100, 200],
+    "backtrack": [1, 2, 3],
+    "random": [0],
+}
+
+def make_bot(bot: str, budget: int) -> GGPA:
+    if bot == "mcts":
+        return MCTSAgent(budget, False, 0.5)
+    if bot == "sampling":
+        return SamplingAgent(budget, False)
+    if bot == "backtrack":
+        return BacktrackBot(budget, False)
+    return RandomAgent()
+
+# Wraps any GGPA and records how long each of its card choices took
+class TimedBot(GGPA):
+    def __init__(self, bot: GGPA):
+        super().__init__(getattr(bot, 'name', bot.__class__.__name__))
+        self.bot = bot
+        self.decision_times: list[float] = []
+
+    def choose_card(self, game_state: GameState, battle_state: BattleState):
+        start = time.perf_counter()
+        action = self.bot.choose_card(game_state, battle_state)
+        self.decision_times.append(time.perf_counter() - start)
+        return action
+
+    def choose_agent_target(self, battle_state: BattleState, list_name: str, agent_list: list[Agent]) -> Agent:
+        return self.bot.choose_agent_target(battle_state, list_name, agent_list)
+
+    def choose_card_target(self, battle_state: BattleState, list_name: str, card_list: list[Card]) -> Card:
+        return self.bot.choose_card_target(battle_state, list_name, card_list)
+
+def play_game(bot: str, budget: int, scenario: str, seed: int) -> dict:
+    timed_bot = TimedBot(make_bot(bot, budget))
+    battle_state = make_battle_state(scenario, timed_bot, seed=seed)
+    battle_state.run()
+    return {
+        'score': battle_state.score(),
+        'decisions': len(timed_bot.decision_times),
+        'decision_time': sum(timed_bot.decision_times),
+    }
+
+# results are only reused while the code of the engine and the bots is unchanged
+def get_source_hash() -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    source_hash = hashlib.sha256()
+    for directory in [root, os.path.join(root, 'ggpa'), os.path.join(root, 'action'), os.path.join(root, 'target')]:
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    source_hash.update(f.read())
+    return source_hash.hexdigest()[:16]
+
+def load_cache(filename: str) -> dict[str, dict]:
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+def save_cache(filename: str, cache: dict[str, dict]):
+    with open(filename, 'w') as f:
+        json.dump(cache, f)
+
+def get_key(source_hash: str, bot: str, budget: int, scenario: str, seed: int) -> str:
+    return f"{source_hash}/{bot}/{budget}/{scenario}/{seed}"
+
+def run(bots: list[str], scenarios: list[str], games: int, jobs: int, cache_file: str) -> list[dict]:
+    source_hash = get_source_hash()
+    cache = load_cache(cache_file)
+    configs = [(bot, budget, scenario) for bot in bots for budget in BUDGETS[bot] for scenario in scenarios]
+    missing = [(bot, budget, scenario, seed) for bot, budget, scenario in configs for seed in range(games)
+               if get_key(source_hash, bot, budget, scenario, seed) not in cache]
+    print(f"{len(configs) * games - len(missing)} cached games, playing {len(missing)}")
+    if missing:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(play_game, *game): game for game in missing}
+            for i, future in enumerate(as_completed(futures)):
+                cache[get_key(source_hash, *futures[future])] = future.result()
+                # saved as it goes, an interrupted sweep keeps the games it finished
+                if i % 20 == 19:
+                    save_cache(cache_file, cache)
+        save_cache(cache_file, cache)
+    rows = []
+    for bot, budget, scenario in configs:
+        results = [cache[get_key(source_hash, bot, budget, scenario, seed)] for seed in range(games)]
+        decisions = sum(result['decisions'] for result in results)
+        rows.append({
+            'bot': bot,
+            'budget': budget,
+            'scenario': scenario,
+            'ms_per_decision': sum(result['decision_time'] for result in results) / max(decisions, 1) * 1000,
+            'average_score': sum(result['score'] for result in results) / games,
+            'win_rate': sum(result['score'] > 0.999 for result in results) / games,
+        })
+    return rows
+
+def main(bots: list[str], scenarios: list[str], games: int, jobs: int, cache_file: str, output: str|None):
+    rows = run(bots, scenarios, games, jobs, cache_file)
+    # one quality-versus-time curve per bot and scenario, in budget order
+    print(f"{'scenario':<10} {'bot':<10} {'budget':>6} {'ms/decision':>12} {'avg score':>10} {'win rate':>9}")
+    for row in sorted(rows, key=lambda row: (row['scenario'], row['bot'], row['budget'])):
+        print(f"{row['scenario']:<10} {row['bot']:<10} {row['budget']:>6} {row['ms_per_decision']:>12.2f} {row['average_score']:>10.3f} {row['win_rate']*100:>8.1f}%")
+    if output is not None:
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='strength_bench',
+                    description="Bot strength against wall time per decision over a sweep of budgets")
+    parser.add_argument('-b', '--bot', nargs='*', default=list(BUDGETS.keys()), choices=list(BUDGETS.keys()))
+    parser.add_argument('-s', '--scenario', nargs='*', default=SCENARIOS)
+    parser.add_argument('-g', '--games', type=int, default=20, help="games per bot, budget and scenario")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--cache', default="strength_cache.json", help="JSON file of finished games")
+    parser.add_argument('-o', '--output', help="write the curves to this CSV file")
+    args = parser.parse_args()
+    main(args.bot, args.scenario, args.games, args.jobs, args.cache, args.output)
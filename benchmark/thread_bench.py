@@ -0,0 +1,42 @@
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from ggpa.mcts_bot import MCTSAgent
+from benchmark.parallel_bench import get_decision_states
+
+def measure(workers: int, states, iterations: int) -> float:
+    agent = MCTSAgent(iterations, False, 0.5, reuse_tree=False, workers=workers, parallel='tree')
+    for state in states:
+        state.player.bot = agent
+    start = time.perf_counter()
+    for state in states:
+        agent.choose_card(state.game_state, state.copy_undeterministic())
+    elapsed = time.perf_counter() - start
+    return iterations * len(states) / elapsed
+
+def main(scenario: str, iterations: int, decisions: int, max_threads: int):
+    # threads only run in parallel when the interpreter was built without the GIL
+    gil = sys._is_gil_enabled() if hasattr(sys, '_is_gil_enabled') else True
+    print(f"python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, {os.cpu_count()} cores")
+    states = get_decision_states(scenario, 3, decisions)
+    print(f"{'threads':>7} {'iterations/s':>13} {'speedup':>8} {'efficiency':>11}")
+    base = None
+    threads = 1
+    while threads <= max_threads:
+        rate = measure(threads, states, iterations)
+        base = base or rate
+        print(f"{threads:>7} {rate:>13.0f} {rate/base:>7.2f}x {rate/base/threads*100:>10.1f}%")
+        threads *= 2
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='thread_bench',
+                    description='Throughput of tree-parallel MCTS against single-threaded search')
+    parser.add_argument('-s', '--scenario', default="boss")
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    parser.add_argument('-d', '--decisions', type=int, default=10)
+    parser.add_argument('-t', '--max-threads', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.scenario, args.iterations, args.decisions, args.max_threads)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ggpa.mcts_bot import MCTSAgent, TreeNode
+from ggpa.turn_plan_bot import TurnPlanAgent
+from main import make_battle_state
+from benchmark.parallel_bench import get_decision_states
+
+BOTS = ["mcts", "turnplan"]
+
+def make_bot(bot: str, iterations: int):
+    if bot == "mcts":
+        return MCTSAgent(iterations, False, 0.5, reuse_tree=False)
+    return TurnPlanAgent(iterations, False, 0.5)
+
+# search speed on the same decision states, with how many turns ahead of the decision the tree reached:
+# the turn every rollout starts in is recorded by wrapping TreeNode.rollout
+def measure(bot: str, states, iterations: int) -> tuple[float, float, int]:
+    agent = make_bot(bot, iterations)
+    depths: list[int] = []
+    rollout = TreeNode.rollout
+    root_turn = 0
+    def recording_rollout(self, state):
+        depths.append(state.turn - root_turn)
+        rollout(self, state)
+    TreeNode.rollout = recording_rollout
+    try:
+        start = time.perf_counter()
+        for state in states:
+            state.player.bot = agent
+            root_turn = state.turn
+            agent.plan = []
+            agent.choose_card(state.game_state, state.copy_undeterministic())
+        elapsed = time.perf_counter() - start
+    finally:
+        TreeNode.rollout = rollout
+    return iterations * len(states) / elapsed, sum(depths) / max(len(depths), 1), max(depths, default=0)
+
+def play_game(bot: str, iterations: int, scenario: str, seed: int) -> float:
+    battle_state = make_battle_state(scenario, make_bot(bot, iterations), seed=seed)
+    battle_state.run()
+    return battle_state.score()
+
+def main(scenario: str, bots: list[str], iterations: int, decisions: int, games: int, jobs: int):
+    states = get_decision_states(scenario, 3, decisions)
+    print(f"{scenario} with {iterations} iterations")
+    print(f"{'bot':<9} {'iterations/s':>13} {'avg turns ahead':>16} {'max turns ahead':>16} {'avg score':>10} {'win rate':>9}")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for bot in bots:
+            rate, depth, max_depth = measure(bot, states, iterations)
+            scores = list(pool.map(play_game, *zip(*[(bot, iterations, scenario, seed) for seed in range(games)])))
+            wins = sum(score > 0.999 for score in scores)
+            print(f"{bot:<9} {rate:>13.0f} {depth:>16.2f} {max_depth:>16} {sum(scores)/games:>10.3f} {wins*100/games:>8.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog='turn_plan_bench',
+                    description='Look-ahead, search speed and playing strength of turn plan MCTS against MCTS')
+    parser.add_argument('-s', '--scenario', default="boss")
+    parser.add_argument('-b', '--bot', nargs='*', choices=BOTS, default=BOTS)
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('-d', '--decisions', type=int, default=10, help="decision states the search is measured on")
+    parser.add_argument('-g', '--games', type=int, default=10, help="games played with every bot")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.scenario, args.bot, args.iterations, args.decisions, args.games, args.jobs)
@@ -9,11 +9,21 @@ from status_effecs import StatusEffectRepo, StatusEffectDefinition
 from value import Value, ConstValue, UpgradableOnce, LinearUpgradable
 from utility import RandomStr
 from typing import TYPE_CHECKING, Callable
+import copy
+import weakref
 if TYPE_CHECKING:
     from game import GameState
     from battle import BattleState
 
-class Card:
+# what a value is made of, including how it upgrades, e.g. ('UpgradableOnce', (('threshold', 1), ('upgrade_count', 0), ...))
+def _get_value_signature(value: Value) -> tuple:
+    return (value.__class__.__name__, tuple(sorted(vars(value).items())))
+
+class CardDefinition:
+    # Definitions by (name, upgrade count). A name is only taken while a card still uses its definition,
+    # and a card that reuses a taken name must define the same card (see get_signature)
+    interned: weakref.WeakValueDictionary[tuple[str, int], CardDefinition] = weakref.WeakValueDictionary()
+
     def __init__(self, name: str, card_type: CardType, mana_cost: Value, character: Character, rarity: Rarity, *actions: Action|CardTargetedL1, desc: str|None = None):
         self.name = name
         self.card_type = card_type
@@ -22,39 +32,120 @@ class Card:
         self.rarity = rarity
         self.upgrade_count = 0
         self.mana_action = AddMana(mana_cost.negative())
-        self.actions: list[Action] = []
-        for action in actions:
+        self.actions: list[Action|CardTargetedL1] = [action for action in actions]
+        self.desc = desc if desc is not None else " ".join([f"{action}" for action in self.actions])
+        # the definitions upgraded from this one, by the number of upgrades
+        self.upgrades: dict[int, CardDefinition] = {}
+
+    # everything that makes the card but its name
+    def get_signature(self) -> tuple:
+        return (self.card_type, _get_value_signature(self.mana_cost), self.character, self.rarity, self.desc,
+                tuple((repr(action), tuple(_get_value_signature(value) for value in action.values)) for action in self.actions))
+
+    def intern(self) -> CardDefinition:
+        key = (self.name, self.upgrade_count)
+        definition = CardDefinition.interned.get(key)
+        if definition is None:
+            CardDefinition.interned[key] = self
+            return self
+        if definition is not self and definition.get_signature() != self.get_signature():
+            raise Exception("Card {} is already defined differently: {!r}".format(self.get_name(), definition))
+        return definition
+
+    def upgraded(self, times: int) -> CardDefinition:
+        if times not in self.upgrades:
+            definition = copy.deepcopy(self, {id(self.upgrades): {}})
+            definition.upgrade_count += times
+            definition.mana_cost.upgrade(times)
+            for action in definition.actions:
+                for val in action.values:
+                    val.upgrade(times)
+            self.upgrades[times] = definition
+        return self.upgrades[times]
+
+    def renamed(self, name: str) -> CardDefinition:
+        definition = copy.copy(self)
+        definition.name = name
+        definition.upgrades = {}
+        return definition.intern()
+
+    def play(self, card: Card, game_state: GameState, battle_state: BattleState):
+        self.mana_action.play(game_state.player, game_state, battle_state)
+        for action in self.actions:
             if isinstance(action, Action):
-                self.actions.append(action)
+                action.play(game_state.player, game_state, battle_state)
             else:
-                self.actions.append(action.By(self))
-        self.desc = desc if desc is not None else " ".join([f"{action}" for action in self.actions])
+                action.By(card).play(game_state.player, game_state, battle_state)
+
+    def get_name(self) -> str:
+        return "{}{}".format(self.name, "+"*self.upgrade_count)
+
+    def __repr__(self) -> str:
+        return "{}-cost:{}-{}-{}\n-".format(self.get_name(), self.mana_cost.peek(), self.card_type, self.rarity) + \
+            "\n-".join(['' + action.__repr__() for action in self.actions])
+
+# A card in a pile only points at its shared definition, which changes when it is upgraded
+class Card:
+    __slots__ = ('definition',)
+
+    def __init__(self, name: str, card_type: CardType, mana_cost: Value, character: Character, rarity: Rarity, *actions: Action|CardTargetedL1, desc: str|None = None):
+        self.definition = CardDefinition(name, card_type, mana_cost, character, rarity, *actions, desc=desc).intern()
+
+    @staticmethod
+    def from_definition(definition: CardDefinition) -> Card:
+        card = Card.__new__(Card)
+        card.definition = definition
+        return card
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+    @property
+    def card_type(self) -> CardType:
+        return self.definition.card_type
+
+    @property
+    def mana_cost(self) -> Value:
+        return self.definition.mana_cost
+
+    @property
+    def character(self) -> Character:
+        return self.definition.character
+
+    @property
+    def rarity(self) -> Rarity:
+        return self.definition.rarity
+
+    @property
+    def upgrade_count(self) -> int:
+        return self.definition.upgrade_count
+
+    @property
+    def actions(self) -> list[Action|CardTargetedL1]:
+        return self.definition.actions
     
     def play(self, game_state: GameState, battle_state: BattleState):
         assert self.is_playable(game_state, battle_state)
-        self.mana_action.play(game_state.player, game_state, battle_state)
-        for action in self.actions:
-            action.play(game_state.player, game_state, battle_state)
+        self.definition.play(self, game_state, battle_state)
 
     def is_playable(self, game_state: GameState, battle_state: BattleState):
-        return self.mana_cost.peek() <= battle_state.mana
+        return self.definition.mana_cost.peek() <= battle_state.mana
+
+    def clone(self) -> Card:
+        return Card.from_definition(self.definition)
 
     def upgrade(self, times: int = 1):
-        self.upgrade_count += times
-        self.mana_cost.upgrade(times)
-        for action in self.actions:
-            for val in action.values:
-                val.upgrade(times)
+        self.definition = self.definition.upgraded(times)
 
     def get_name(self) -> str:
-        return "{}{}".format(self.name, "+"*self.upgrade_count)
+        return self.definition.get_name()
     
     def __repr__(self) -> str:
-        return "{}-cost:{}-{}-{}\n-".format(self.get_name(), self.mana_cost.peek(), self.card_type, self.rarity) + \
-            "\n-".join(['' + action.__repr__() for action in self.actions])
+        return self.definition.__repr__()
 
     def get_description(self) -> str:
-        return self.desc
+        return self.definition.desc
 
 class CardGen:
     Strike = lambda: Card("Strike", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(6, 9)).To(ChooseAgentTarget(AgentSet.ENEMY)))
@@ -202,5 +293,5 @@ class CardRepo:
     @staticmethod
     def anonymize_deck(cards: list[Card]):
         for card in cards:
-            card.name = RandomStr.get_hashed(card.name)
+            card.definition = card.definition.renamed(RandomStr.get_hashed(card.name))
         return cards
\ No newline at end of file
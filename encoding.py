@@ -0,0 +1,93 @@
+from __future__ import annotations
+import numpy as np
+from status_effecs import StatusEffectRepo, StatusEffectDefinition
+from batch_sim import STATUSES, behaviours
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from battle import BattleState
+    from card import Card, CardDefinition
+
+# every status effect of StatusEffectRepo, a status is the sum of its values (e.g. the turns of all bombs)
+ENCODED_STATUSES: list[StatusEffectDefinition] = [value for value in vars(StatusEffectRepo).values() if isinstance(value, StatusEffectDefinition)]
+# the enemy's next move, as in EnemyBehaviours.expected_moves
+INTENT_FEATURES = ["damage", "hits", "block"] + [f"player_{status.name}" for status in STATUSES] + [f"self_{status.name}" for status in STATUSES]
+
+# Turns a BattleState into a fixed layout of numbers (see names for what each position holds):
+# the player, mana and turn, every enemy slot with its intent, and card counts per kind in every pile.
+# Cards of other kinds than the given ones are counted in an extra column per pile.
+class StateEncoder:
+    def __init__(self, kinds: list[tuple[str, int]], max_enemies: int = 1, dtype=np.float32):
+        self.kinds = list(kinds)
+        self.max_enemies = max_enemies
+        self.dtype = dtype
+        self.kind_index = {kind: i for i, kind in enumerate(self.kinds)}
+        self.definition_index: dict[CardDefinition, int] = {}
+        self.status_index = {status.name: i for i, status in enumerate(ENCODED_STATUSES)}
+        self.names: list[str] = ["health", "max_health", "block"] + [f"status_{status.name}" for status in ENCODED_STATUSES] + ["mana", "turn"]
+        self.enemy_offset = len(self.names)
+        self.enemy_size = 4 + len(ENCODED_STATUSES) + len(INTENT_FEATURES)
+        for e in range(max_enemies):
+            self.names += [f"enemy{e}_{name}" for name in ["present", "health", "max_health", "block"]]
+            self.names += [f"enemy{e}_status_{status.name}" for status in ENCODED_STATUSES]
+            self.names += [f"enemy{e}_intent_{name}" for name in INTENT_FEATURES]
+        self.pile_offset = len(self.names)
+        for pile in ["hand", "draw", "discard", "exhaust"]:
+            self.names += [f"{pile}_{name}{'+' * upgrades}" for name, upgrades in self.kinds] + [f"{pile}_other"]
+        self.size = len(self.names)
+
+    # the kinds of a deck, e.g. the deck of a scenario
+    @staticmethod
+    def from_deck(deck: list[Card], max_enemies: int = 1, dtype=np.float32) -> StateEncoder:
+        kinds = list(dict.fromkeys((card.name, card.upgrade_count) for card in deck))
+        return StateEncoder(kinds, max_enemies, dtype)
+
+    def _get_kind(self, definition: CardDefinition) -> int:
+        kind = self.definition_index.get(definition)
+        if kind is None:
+            kind = self.definition_index[definition] = self.kind_index.get((definition.name, definition.upgrade_count), len(self.kinds))
+        return kind
+
+    def _encode_statuses(self, agent, out: np.ndarray, offset: int):
+        for status_effect in agent.status_effect_state.status_effects:
+            out[offset + self.status_index[status_effect.definition.name]] += status_effect.val
+
+    # writes the encoding of state into out (a row of size self.size) and returns it
+    def encode(self, state: BattleState, out: np.ndarray|None = None) -> np.ndarray:
+        if out is None:
+            out = np.zeros(self.size, dtype=self.dtype)
+        else:
+            out.fill(0)
+        player = state.player
+        out[0] = player.health
+        out[1] = player.max_health
+        out[2] = player.block
+        self._encode_statuses(player, out, 3)
+        out[self.enemy_offset - 2] = state.mana
+        out[self.enemy_offset - 1] = state.turn
+        ascension = state.game_state.ascension
+        for e, enemy in enumerate(state.enemies[:self.max_enemies]):
+            offset = self.enemy_offset + e * self.enemy_size
+            out[offset] = 1
+            out[offset + 1] = enemy.health
+            out[offset + 2] = enemy.max_health
+            out[offset + 3] = enemy.block
+            self._encode_statuses(enemy, out, offset + 4)
+            offset += 4 + len(ENCODED_STATUSES)
+            state_id = behaviours.get_state_id(enemy, ascension)
+            out[offset:offset + len(INTENT_FEATURES)] = behaviours.get_tables().expected_moves[state_id]
+        offset = self.pile_offset
+        for pile in (state.hand, state.draw_pile, state.discard_pile, state.exhaust_pile):
+            for card in pile:
+                out[offset + self._get_kind(card.definition)] += 1
+            offset += len(self.kinds) + 1
+        return out
+
+    # writes the encodings of states into the first rows of out, e.g. a buffer reused for every batch of leaves
+    def encode_batch(self, states: list[BattleState], out: np.ndarray) -> np.ndarray:
+        assert out.shape[0] >= len(states) and out.shape[1] == self.size, "The buffer has room for {} encodings of size {}".format(out.shape[0], out.shape[1])
+        for i, state in enumerate(states):
+            self.encode(state, out[i])
+        return out[:len(states)]
+
+    def get_buffer(self, count: int) -> np.ndarray:
+        return np.zeros((count, self.size), dtype=self.dtype)
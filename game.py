@@ -11,6 +11,13 @@ class GameState:
         self.draw_count = 5
         self.max_mana = 3
 
+    def clone(self) -> GameState:
+        ret = GameState.__new__(GameState)
+        ret.__dict__.update(self.__dict__)
+        ret.player = self.player.clone()
+        ret.deck = list(self.deck)
+        return ret
+
     def add_to_deck(self, *cards):
         self.deck.extend(cards)
 
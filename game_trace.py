@@ -0,0 +1,269 @@
+from __future__ import annotations
+import io
+import mmap
+import os
+import struct
+from array import array
+from action.action import EndAgentTurn, PlayCard
+from config import Character, Verbose
+from ggpa.ggpa import GGPA
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from battle import BattleState
+    from agent import Agent
+    from card import Card
+    from game import GameState
+
+# Binary trace of battles. A battle is deterministic given its seed, its starting position and the
+# player's choices, so only those are stored and any position is reconstructed by re-simulating.
+#
+# file:    MAGIC, then the games one after another
+# game:    header, one byte per choice, GAME_END and the result as a signed byte
+# header:  seed (u64), character (u8), ascension (u16), max health and health (u16, u16),
+#          card count (u16) and per card its name and upgrade count (u8),
+#          enemy count (u8) and per enemy its class name, max health and health (u16, u16)
+# names:   length (u8) and utf-8 bytes
+# choices: a card choice is the hand index of the played card (below END_TURN) or END_TURN,
+#          a target choice is TARGET | the index of the chosen agent or card
+# The index file (the trace's name + INDEX_EXTENSION) holds the offset of every game as a u64,
+# so that a reader can jump to game N without scanning the trace.
+MAGIC = b'MSTSTRC1'
+INDEX_EXTENSION = '.idx'
+END_TURN = 0x7F
+TARGET = 0x80
+GAME_END = 0xFF
+HEADER = struct.Struct('<QBHHHH')
+HEALTH = struct.Struct('<HH')
+
+def _pack_name(name: str) -> bytes:
+    data = name.encode()
+    return bytes([len(data)]) + data
+
+class TraceWriter:
+    # without a filename the games are only kept in memory, see get_games
+    def __init__(self, filename: str|None = None):
+        self.filename = filename
+        if filename is None:
+            self.file = io.BytesIO()
+            self.index = None
+            return
+        self.file = open(filename, 'ab')
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.index = open(filename + INDEX_EXTENSION, 'ab')
+
+    def begin_game(self, battle_state: BattleState):
+        game_state = battle_state.game_state
+        player = battle_state.player
+        if self.index is not None:
+            self.index.write(struct.pack('<Q', self.file.tell()))
+        header = bytearray(HEADER.pack(battle_state.seed, player.character.value, game_state.ascension, player.max_health, player.health, len(game_state.deck)))
+        for card in game_state.deck:
+            header += _pack_name(card.name) + bytes([card.upgrade_count])
+        header.append(len(battle_state.enemies))
+        for enemy in battle_state.enemies:
+            header += _pack_name(enemy.__class__.__name__) + HEALTH.pack(enemy.max_health, enemy.health)
+        self.file.write(header)
+
+    def record_card_choice(self, action: PlayCard|EndAgentTurn):
+        assert isinstance(action, EndAgentTurn) or action.card_index < END_TURN, "Hand index {} cannot be traced".format(action.card_index)
+        self.file.write(bytes([END_TURN if isinstance(action, EndAgentTurn) else action.card_index]))
+
+    def record_target_choice(self, index: int):
+        assert index < TARGET - 1, "Target index {} cannot be traced".format(index)
+        self.file.write(bytes([TARGET | index]))
+
+    def end_game(self, battle_state: BattleState):
+        self.file.write(bytes([GAME_END]) + struct.pack('<b', battle_state.get_end_result()))
+
+    # appends the games of an in-memory writer (e.g. one that ran in another process)
+    def write_games(self, data: bytes):
+        start = self.file.tell()
+        if self.index is not None:
+            for offset in TraceReader(MAGIC + data).offsets:
+                self.index.write(struct.pack('<Q', start + offset - len(MAGIC)))
+        self.file.write(data)
+
+    def get_games(self) -> bytes:
+        return self.file.getvalue()
+
+    def close(self):
+        if self.filename is not None:
+            self.file.close()
+            self.index.close()
+
+class GameTrace:
+    def __init__(self, seed: int, character: Character, ascension: int, max_health: int, health: int,
+                 deck: list[tuple[str, int]], enemies: list[tuple[str, int, int]], choices: bytes, result: int|None):
+        self.seed = seed
+        self.character = character
+        self.ascension = ascension
+        self.max_health = max_health
+        self.health = health
+        self.deck = deck
+        self.enemies = enemies
+        self.choices = choices
+        # None if the game was not finished when it was traced
+        self.result = result
+
+    def get_decision_count(self) -> int:
+        return sum(1 for choice in self.choices if choice < TARGET)
+
+    def __repr__(self) -> str:
+        return "seed {}, deck {}, enemies {}, {} choices, result {}".format(
+            self.seed, [f"{name}{'+'*upgrades}" for name, upgrades in self.deck], self.enemies, len(self.choices), self.result)
+
+class TraceReader:
+    def __init__(self, data: bytes|mmap.mmap, offsets: list[int]|array|None = None):
+        assert data[:len(MAGIC)] == MAGIC, "Not a game trace"
+        self.data = data
+        self.offsets = offsets if offsets is not None else self._scan()
+
+    # The trace is mapped into memory, so only the games that are read are loaded from the disk.
+    # The index file is used when present, otherwise the game offsets are found by scanning the trace once.
+    @staticmethod
+    def open(filename: str) -> TraceReader:
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offsets = None
+        if os.path.exists(filename + INDEX_EXTENSION):
+            offsets = array('Q')
+            with open(filename + INDEX_EXTENSION, 'rb') as f:
+                offsets.frombytes(f.read())
+        return TraceReader(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def _read_name(self, offset: int) -> tuple[str, int]:
+        length = self.data[offset]
+        return self.data[offset + 1:offset + 1 + length].decode(), offset + 1 + length
+
+    def _read_header(self, offset: int) -> tuple[tuple, int]:
+        seed, character, ascension, max_health, health, card_count = HEADER.unpack_from(self.data, offset)
+        offset += HEADER.size
+        deck = []
+        for _ in range(card_count):
+            name, offset = self._read_name(offset)
+            deck.append((name, self.data[offset]))
+            offset += 1
+        enemies = []
+        enemy_count = self.data[offset]
+        offset += 1
+        for _ in range(enemy_count):
+            name, offset = self._read_name(offset)
+            enemies.append((name, *HEALTH.unpack_from(self.data, offset)))
+            offset += HEALTH.size
+        return (seed, Character(character), ascension, max_health, health, deck, enemies), offset
+
+    def _scan(self) -> list[int]:
+        offsets = []
+        offset = len(MAGIC)
+        while offset < len(self.data):
+            offsets.append(offset)
+            _, offset = self._read_header(offset)
+            # choices never reach GAME_END, so its first occurrence after the header ends the game
+            end = self.data.find(bytes([GAME_END]), offset)
+            if end < 0:
+                break
+            offset = end + 2
+        return offsets
+
+    def read_game(self, n: int) -> GameTrace:
+        header, offset = self._read_header(self.offsets[n])
+        end = self.offsets[n + 1] if n + 1 < len(self.offsets) else len(self.data)
+        choices = self.data[offset:end]
+        result = None
+        if len(choices) >= 2 and choices[-2] == GAME_END:
+            result = struct.unpack('<b', choices[-1:])[0]
+            choices = choices[:-2]
+        return GameTrace(*header, choices, result)
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self.read_game(n)
+
+class ReplayFinished(Exception):
+    pass
+
+# Plays the choices of a trace back, stopping the battle when the given number of decisions was made
+class ReplayBot(GGPA):
+    def __init__(self, choices: bytes, decisions: int|None = None):
+        super().__init__("Replay")
+        self.choices = choices
+        self.position = 0
+        self.decisions_left = decisions
+
+    def _next_choice(self) -> int:
+        assert self.position < len(self.choices), "The trace has no more choices"
+        choice = self.choices[self.position]
+        self.position += 1
+        return choice
+
+    def choose_card(self, game_state: GameState, battle_state: BattleState) -> PlayCard|EndAgentTurn:
+        if self.decisions_left is not None:
+            if self.decisions_left == 0:
+                raise ReplayFinished()
+            self.decisions_left -= 1
+        choice = self._next_choice()
+        return EndAgentTurn() if choice == END_TURN else PlayCard(choice)
+
+    def choose_agent_target(self, battle_state: BattleState, list_name: str, agent_list: list[Agent]) -> Agent:
+        return agent_list[self._next_choice() & ~TARGET]
+
+    def choose_card_target(self, battle_state: BattleState, list_name: str, card_list: list[Card]) -> Card:
+        return card_list[self._next_choice() & ~TARGET]
+
+def _get_card_generators() -> dict:
+    from card import card_index
+    generators = {}
+    for key, generator in card_index.items():
+        if not key.startswith('_'):
+            generators[generator().name] = generator
+    return generators
+
+# The position of the traced game after the given number of player decisions, or its end if None.
+# The returned state is the one the bot was shown for the next decision, except that its draw pile is not shuffled.
+def replay(trace: GameTrace, decisions: int|None = None) -> BattleState:
+    from game import GameState
+    from battle import BattleState
+    import agent
+    import random
+    generators = _get_card_generators()
+    bot = ReplayBot(trace.choices, decisions)
+    game_state = GameState(trace.character, bot, trace.ascension, trace.max_health)
+    game_state.player.health = trace.health
+    deck = []
+    for name, upgrades in trace.deck:
+        card = generators[name]()
+        if upgrades > 0:
+            card.upgrade(upgrades)
+        deck.append(card)
+    game_state.set_deck(deck)
+    enemies = []
+    for name, max_health, health in trace.enemies:
+        # the traced health replaces the one drawn here
+        enemy = agent.make_enemy(name, game_state, random.Random(0))
+        enemy.max_health = max_health
+        enemy.health = health
+        enemies.append(enemy)
+    battle_state = BattleState(game_state, *enemies, verbose=Verbose.NO_LOG, seed=trace.seed)
+    try:
+        battle_state.run()
+    except ReplayFinished:
+        pass
+    return battle_state
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+                    prog='game_trace',
+                    description='Shows a traced game, or its position after some decisions')
+    parser.add_argument('filename')
+    parser.add_argument('game', type=int)
+    parser.add_argument('-d', '--decisions', type=int, help="replay only this many player decisions")
+    args = parser.parse_args()
+    trace = TraceReader.open(args.filename).read_game(args.game)
+    print(trace)
+    print(replay(trace, args.decisions).get_visualization())
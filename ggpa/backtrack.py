@@ -2,7 +2,6 @@ from __future__ import annotations
 from ggpa.ggpa import GGPA
 from action.action import EndAgentTurn, PlayCard
 from typing import TYPE_CHECKING
-import random
 from config import Verbose
 if TYPE_CHECKING:
     from game import GameState
@@ -17,7 +16,7 @@ class BacktrackBot(GGPA):
         super().__init__(f"Backtrack-Depth{depth}{'-save' if should_save_states else ''}")
         self.depth = depth
         self.should_save_states = should_save_states
-        self.memory: dict[str, float|None] = {}
+        self.memory: dict[int, float|None] = {}
         self.memory_hit = 0
 
     def _rollout_state(self, game_state: GameState, battle_state: BattleState, count: int) -> list[BattleState]:
@@ -30,7 +29,7 @@ class BacktrackBot(GGPA):
             ret[i].verbose = Verbose.NO_LOG
             while not stop(ret[i]):
                 options = self.get_choose_card_options(ret[i].game_state, ret[i])
-                option = random.choice(options)
+                option = ret[i].rng.choice(options)
                 ret[i].tick_player(option)
         return ret
 
@@ -55,26 +54,24 @@ class BacktrackBot(GGPA):
         options = self.get_choose_card_options(game_state, battle_state)
         best_value, best_action = None, None
         for option in options:
-            battle_state_copy: BattleState = battle_state.copy_undeterministic()
-            battle_state_copy.verbose = Verbose.NO_LOG
             #print(f"{depth_remaining}: Tick battle {option}")
-            if not battle_state_copy.tick_player(option):
-                estimate = self._evaluate_state(battle_state_copy.game_state, battle_state_copy)
+            if not battle_state.tick_player(option):
+                estimate = self._evaluate_state(game_state, battle_state)
                 #print(f"{depth_remaining-1}: Ended {estimate}")
             else:
-                state_hash = ''
                 if self.should_save_states:
-                    state_hash = battle_state_copy.get_undeterministic_repr_hash()
+                    state_hash = battle_state.get_hash()
                     if state_hash in self.memory:
                         estimate = self.memory[state_hash]
                         self.memory_hit += 1
                     else:
-                        estimate, _ = self._get_best_choose_card(battle_state_copy.game_state, battle_state_copy, depth_remaining-1)
+                        estimate, _ = self._get_best_choose_card(game_state, battle_state, depth_remaining-1)
                         self.memory[state_hash] = estimate
                 else:
                     #print(f"{depth_remaining}: Recursive")
-                    estimate, _ = self._get_best_choose_card(battle_state_copy.game_state, battle_state_copy, depth_remaining-1)
+                    estimate, _ = self._get_best_choose_card(game_state, battle_state, depth_remaining-1)
                     #print(f"{depth_remaining}: Back")
+            battle_state.undo()
             #print(f"{depth_remaining}: Estimate: {estimate}")
             if best_value is None or (estimate is not None and best_value < estimate):
                 best_value = estimate
@@ -85,7 +82,11 @@ class BacktrackBot(GGPA):
         return best_value, best_action
 
     def choose_card(self, game_state: GameState, battle_state: BattleState) -> EndAgentTurn|PlayCard:
+        # options are tried with make/unmake on the single copy handed to the bot
+        battle_state.verbose = Verbose.NO_LOG
+        battle_state.begin_journal()
         _, action = self._get_best_choose_card(game_state, battle_state, self.depth)
+        battle_state.end_journal()
         if action is None:
             raise Exception("Depth is 0 or no action is available")
         return action
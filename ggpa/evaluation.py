@@ -0,0 +1,93 @@
+from __future__ import annotations
+from batch_sim import Effects, UnsupportedException, behaviours
+from status_effecs import StatusEffectRepo
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from battle import BattleState
+    from card import CardDefinition
+
+# An evaluator gives an unfinished battle a value on the scale of score(): the score it is expected to end with
+Evaluator = Callable[['BattleState'], float]
+
+# per card definition: attack damage of one play (all hits, before modifiers), hits and mana cost
+_card_values: dict[CardDefinition, tuple[int, int, int]] = {}
+
+def _get_card_value(definition: CardDefinition) -> tuple[int, int, int]:
+    value = _card_values.get(definition)
+    if value is None:
+        try:
+            effects = Effects.from_card(definition)
+            value = (effects.damage * effects.hits, effects.hits, effects.cost)
+        except UnsupportedException:
+            value = (0, 0, definition.mana_cost.peek())
+        _card_values[definition] = value
+    return value
+
+def score_value(state: BattleState) -> float:
+    return state.score()
+
+# Plays out the race between the player and the enemies from the current turn on:
+# the player's damage per turn is what the average card of its piles deals (with its Strength) times the cards
+# its mana pays for, the enemies' damage per turn is what their expected next moves deal (see EnemyBehaviours).
+# The part of the remaining enemy health dealt before the player is expected to die is added to score();
+# a battle the player is expected to win is worth more the more health the player has left.
+def heuristic_value(state: BattleState) -> float:
+    score = state.score()
+    if state.ended():
+        return score
+    player = state.player
+    player_status = player.status_effect_state
+    ascension = state.game_state.ascension
+    incoming = 0.0
+    enemy_health = 0
+    for enemy in state.enemies:
+        if enemy.is_dead():
+            continue
+        enemy_health += enemy.health + enemy.block
+        try:
+            state_id = behaviours.get_state_id(enemy, ascension)
+        except UnsupportedException:
+            # an enemy the batch simulator cannot compile is left out of the race
+            continue
+        move = behaviours.get_tables().expected_moves[state_id]
+        damage = move[0] + enemy.status_effect_state.get(StatusEffectRepo.STRENGTH) * move[1]
+        if player_status.has(StatusEffectRepo.VULNERABLE):
+            damage *= 1.5
+        if enemy.status_effect_state.has(StatusEffectRepo.WEAK):
+            damage *= 0.75
+        incoming += damage
+    damage = hits = cost = cards = 0
+    for pile in (state.hand, state.draw_pile, state.discard_pile):
+        for card in pile:
+            card_damage, card_hits, card_cost = _get_card_value(card.definition)
+            damage += card_damage
+            hits += card_hits
+            cost += max(card_cost, 0)
+            cards += 1
+    outgoing = 0.0
+    if cards > 0:
+        plays = state.game_state.draw_count if cost == 0 else min(state.game_state.draw_count, state.game_state.max_mana * cards / cost)
+        outgoing = plays * (damage + player_status.get(StatusEffectRepo.STRENGTH) * hits) / cards
+        if player_status.has(StatusEffectRepo.WEAK):
+            outgoing *= 0.75
+    survived = (player.health + player.block) / incoming if incoming > 0 else float('inf')
+    needed = enemy_health / outgoing if outgoing > 0 else float('inf')
+    if survived >= needed:
+        return score + (1 - score) * (0.9 + 0.1 * state.health())
+    return score + (1 - score) * 0.9 * survived / needed
+
+# Where rollouts stop: after turns more turns have started or steps actions were played, whichever comes first
+# (None for no limit). The evaluator gives the value of the state a rollout stopped in.
+class RolloutHorizon:
+    def __init__(self, turns: int|None = None, steps: int|None = None, evaluator: Evaluator = heuristic_value):
+        self.turns = turns
+        self.steps = steps
+        self.evaluator = evaluator
+
+    def reached(self, state: BattleState, start_turn: int, steps: int) -> bool:
+        return (self.turns is not None and state.turn - start_turn >= self.turns) or (self.steps is not None and steps >= self.steps)
+
+    def __repr__(self) -> str:
+        return f"horizon of {self.turns} turns and {self.steps} steps, evaluated by {self.evaluator.__name__}"
+
+EVALUATORS: dict[str, Evaluator] = {"heuristic": heuristic_value, "score": score_value}
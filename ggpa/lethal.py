@@ -0,0 +1,192 @@
+from __future__ import annotations
+import random
+from action.game_action import GameAction
+from batch_sim import Effects, UnsupportedException, VULNERABLE, WEAK, STRENGTH, VIGOR
+from status_effecs import StatusEffectRepo
+from config import MAX_BLOCK, MAX_MANA
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from battle import BattleState
+    from card import CardDefinition
+
+# per card definition: what it does (see batch_sim.Effects), None for cards the solver never plays
+_card_effects: dict[CardDefinition, Effects|None] = {}
+
+def _get_effects(definition: CardDefinition) -> Effects|None:
+    if definition not in _card_effects:
+        try:
+            effects = Effects.from_card(definition)
+            # upgrades depend on the bot's card choice, the other cards are played as they are
+            _card_effects[definition] = None if effects.upgrade or effects.cost < 0 else effects
+        except UnsupportedException:
+            _card_effects[definition] = None
+    return _card_effects[definition]
+
+# per card definition: attack damage (all hits), hits, Strength and Vigor gained and whether it makes Vulnerable
+_card_bounds: dict[CardDefinition, tuple[int, int, int, int, bool]] = {}
+
+def _get_bound_terms(definition: CardDefinition) -> tuple[int, int, int, int, bool]:
+    terms = _card_bounds.get(definition)
+    if terms is None:
+        effects = _get_effects(definition)
+        if effects is None:
+            terms = (0, 0, 0, 0, False)
+        else:
+            terms = (effects.damage * effects.hits, effects.hits, max(int(effects.self_status[STRENGTH]), 0),
+                     max(int(effects.self_status[VIGOR]), 0), bool(effects.target_status[VULNERABLE] > 0))
+        _card_bounds[definition] = terms
+    return terms
+
+# the damage of playing all the cards with all the Strength, Vigor and Vulnerable they give and no regard
+# for mana, more than any line that plays only these cards can deal
+def _get_bound(cards: list[CardDefinition], strength: int, vigor: int, vulnerable: bool) -> float:
+    damage = hits = 0
+    for definition in cards:
+        card_damage, card_hits, card_strength, card_vigor, card_vulnerable = _get_bound_terms(definition)
+        damage += card_damage
+        hits += card_hits
+        strength += card_strength
+        vigor += card_vigor
+        vulnerable = vulnerable or card_vulnerable
+    return (damage + hits * max(vigor, 0)) * (1.5 if vulnerable else 1) + hits * max(strength, 0)
+
+# Draws count cards like BattleState.draw, reshuffling the discard pile into an empty draw pile.
+# The drawn cards are known when the whole pile is drawn or when it holds one kind of card,
+# otherwise the piles become unknown (None) and the cards drawn from then on are left out.
+def _draw(hand: list[int], draw: tuple[int, ...]|None, discard: tuple[int, ...]|None, count: int) -> tuple[list[int], tuple[int, ...]|None, tuple[int, ...]|None]:
+    while count > 0 and draw is not None:
+        remaining = sum(draw)
+        if remaining == 0:
+            if sum(discard) == 0:
+                break
+            draw, discard = discard, tuple(0 for _ in discard)
+            continue
+        kinds = [k for k, c in enumerate(draw) if c > 0]
+        if count >= remaining:
+            hand = [a + b for a, b in zip(hand, draw)]
+            draw = tuple(0 for _ in draw)
+            count -= remaining
+        elif len(kinds) == 1:
+            hand[kinds[0]] += count
+            draw = tuple(c - count if k == kinds[0] else c for k, c in enumerate(draw))
+            count = 0
+        else:
+            return hand, None, None
+    return hand, draw, discard
+
+# depth-first over the plays, with the positions already known to fall short remembered
+def _search(effects_list: list[Effects|None], failed: set[tuple], hand: tuple[int, ...], draw: tuple[int, ...]|None, discard: tuple[int, ...]|None,
+            mana: int, strength: int, vigor: int, vulnerable: bool, weak: bool, health: int, block: int, need: int) -> list[int]|None:
+    key = (hand, draw, discard, mana, strength, vigor, vulnerable, weak, health, block, need)
+    if key in failed:
+        return None
+    for kind, count in enumerate(hand):
+        effects = effects_list[kind]
+        if count == 0 or effects is None or effects.cost > mana:
+            continue
+        left = need
+        new_vigor = vigor
+        if effects.hits > 0:
+            amount = effects.damage + vigor
+            if vulnerable:
+                amount = int(amount * 1.5)
+            if weak:
+                amount = int(amount * 0.75)
+            left -= max(amount + strength, 0) * effects.hits
+            new_vigor = 0
+        # the card's damage to the player comes after its attack, and a dead player loses the battle
+        blocked = min(block, effects.self_damage)
+        new_health = health - effects.self_damage + blocked
+        if new_health <= 0:
+            continue
+        if left <= 0:
+            return [kind]
+        new_hand = list(hand)
+        new_hand[kind] -= 1
+        new_hand, new_draw, new_discard = _draw(new_hand, draw, discard, effects.draw)
+        # the card goes to the discard pile after it was played, with its copy if it makes one
+        discarded = int(effects.copy) + int(not (effects.exhaust or effects.power))
+        if new_discard is not None and discarded > 0:
+            new_discard = tuple(c + discarded if k == kind else c for k, c in enumerate(new_discard))
+        line = _search(effects_list, failed, tuple(new_hand), new_draw, new_discard, min(mana - effects.cost + effects.mana, MAX_MANA),
+                       strength + int(effects.self_status[STRENGTH]), new_vigor + int(effects.self_status[VIGOR]),
+                       vulnerable or bool(effects.target_status[VULNERABLE] > 0), weak or bool(effects.self_status[WEAK] > 0),
+                       new_health, min(block - blocked + effects.block, MAX_BLOCK), left)
+        if line is not None:
+            return [kind] + line
+    failed.add(key)
+    return None
+
+# Finds a sequence of plays from the current hand that kills the only enemy left this turn.
+# Attacks follow the modifiers of DealAttackDamage.event in the order they run: Vigor (gone after the attack),
+# Vulnerable of the enemy, Weak of the player, then Strength; the enemy's block absorbs the hits first.
+# Drawn cards are only used when they are known whatever the order of the draw pile (see _draw). A line is only returned if it is a win,
+# so no line does not mean that there is none (e.g. with several enemies or unsupported cards).
+# The counts of checks and lines found are kept per kind of caller ('decision' or 'rollout').
+class LethalSolver:
+    def __init__(self):
+        self.checks: dict[str, int] = {'decision': 0, 'rollout': 0}
+        self.fired: dict[str, int] = {'decision': 0, 'rollout': 0}
+
+    # verify plays the line on a copy of the state (with a shuffled draw pile) before returning it
+    def solve(self, state: BattleState, caller: str = 'decision', verify: bool = True) -> list[GameAction]|None:
+        self.checks[caller] += 1
+        line = self._find_line(state)
+        if line is not None and verify and not self._verify(state, line):
+            line = None
+        if line is not None:
+            self.fired[caller] += 1
+        return line
+
+    def _verify(self, state: BattleState, line: list[GameAction]) -> bool:
+        return self.play(state.copy_undeterministic(rng=random.Random(0)), line)
+
+    # plays the line on state for as long as its actions are available, returns whether the battle was won
+    @staticmethod
+    def play(state: BattleState, line: list[GameAction]) -> bool:
+        for action in line:
+            if state.ended() or action not in state.get_actions():
+                return False
+            state.step(action)
+        return state.get_end_result() == 1
+
+    def _find_line(self, state: BattleState) -> list[GameAction]|None:
+        if state.ended():
+            return None
+        enemies = [enemy for enemy in state.enemies if not enemy.is_dead()]
+        if len(enemies) != 1:
+            return None
+        enemy = enemies[0]
+        player = state.player
+        need = enemy.health + enemy.block
+        strength = player.status_effect_state.get(StatusEffectRepo.STRENGTH)
+        vigor = player.status_effect_state.get(StatusEffectRepo.VIGOR)
+        vulnerable = enemy.status_effect_state.get(StatusEffectRepo.VULNERABLE) > 0
+        weak = player.status_effect_state.get(StatusEffectRepo.WEAK) > 0
+        # most positions are ruled out by the bound, before the piles are counted
+        hand_pile = [card.definition for card in state.hand]
+        draw_pile = [card.definition for card in state.draw_pile]
+        discard_pile = [card.definition for card in state.discard_pile]
+        draws = any(effects is not None and effects.draw > 0 for effects in map(_get_effects, hand_pile))
+        if _get_bound(hand_pile + draw_pile + discard_pile if draws else hand_pile, strength, vigor, vulnerable) < need:
+            return None
+        definitions = list(dict.fromkeys(hand_pile + draw_pile + discard_pile))
+        effects = [_get_effects(definition) for definition in definitions]
+        index = {definition: i for i, definition in enumerate(definitions)}
+        hand = [0] * len(definitions)
+        for definition in hand_pile:
+            hand[index[definition]] += 1
+        draw = [0] * len(definitions)
+        for definition in draw_pile:
+            draw[index[definition]] += 1
+        discard = [0] * len(definitions)
+        for definition in discard_pile:
+            discard[index[definition]] += 1
+        line = _search(effects, set(), tuple(hand), tuple(draw), tuple(discard), state.mana, strength, vigor, vulnerable, weak, player.health, player.block, need)
+        if line is None:
+            return None
+        return [GameAction((definitions[kind].name, definitions[kind].upgrade_count)) for kind in line]
+
+    def __repr__(self) -> str:
+        return "lethal solver found a win in {}/{} decisions and {}/{} rollout turns".format(
+            self.fired['decision'], self.checks['decision'], self.fired['rollout'], self.checks['rollout'])
@@ -1,6 +1,5 @@
 from __future__ import annotations
 import math
-from copy import deepcopy
 from re import S
 import time
 from unittest import result
@@ -9,23 +8,111 @@ from agent import Agent
 from battle import BattleState
 from card import Card
 from action.action import EndAgentTurn, PlayCard
+from action.game_action import GameAction
 from game import GameState
 from ggpa.ggpa import GGPA
+from ggpa.evaluation import RolloutHorizon
+from ggpa.lethal import LethalSolver
 from config import Verbose
 import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
 
+# Visit statistics of a node, kept apart from the tree so that transposed nodes can share them.
+# Only running sums are kept; debug additionally retains every sample for print_tree.
+class NodeStats:
+    def __init__(self, debug: bool = False):
+        self.visits = 0
+        self.total = 0
+        self.total_squares = 0
+        self.min: float|None = None
+        self.max: float|None = None
+        self.samples: list[float]|None = [] if debug else None
+
+    def add(self, result: float):
+        self.visits += 1
+        self.total += result
+        self.total_squares += result * result
+        if self.min is None or result < self.min:
+            self.min = result
+        if self.max is None or result > self.max:
+            self.max = result
+        if self.samples is not None:
+            self.samples.append(result)
+
+    def merge(self, other: NodeStats):
+        self.visits += other.visits
+        self.total += other.total
+        self.total_squares += other.total_squares
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if self.samples is not None and other.samples is not None:
+            self.samples += other.samples
+
+    def get_mean(self) -> float:
+        return self.total / self.visits
+
+    def get_variance(self) -> float:
+        mean = self.get_mean()
+        return max(0, self.total_squares / self.visits - mean * mean)
+
+    def __repr__(self) -> str:
+        if self.visits == 0:
+            return "visits: 0"
+        return f"visits: {self.visits}, mean: {self.get_mean():.4f}, variance: {self.get_variance():.4f}, min: {self.min}, max: {self.max}"
+
+# Bounded map from BattleState.get_hash() to the statistics of that position.
+# When full, the oldest entry is dropped; nodes that already hold it keep using it.
+class TranspositionTable:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: dict[int, NodeStats] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    # returns the stats stored for key, or stores and returns new_stats if there are none
+    def get(self, key: int, new_stats: NodeStats) -> NodeStats:
+        self.lookups += 1
+        stats = self.entries.get(key)
+        if stats is not None:
+            self.hits += 1
+            return stats
+        if len(self.entries) >= self.capacity:
+            del self.entries[next(iter(self.entries))]
+        self.entries[key] = new_stats
+        return new_stats
+
+    def get_hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups > 0 else 0
+
+    def get_occupancy(self) -> float:
+        return len(self.entries) / self.capacity
+
+    def __repr__(self) -> str:
+        return f"transposition table hit rate: {self.get_hit_rate()*100:.2f}% ({self.hits}/{self.lookups}), occupancy: {self.get_occupancy()*100:.2f}% ({len(self.entries)}/{self.capacity})"
+
 # You only need to modify the TreeNode!
 class TreeNode:
     # You can change this to include other attributes. 
     # param is the value passed via the -p command line option (default: 0.5)
     # You can use this for e.g. the "c" value in the UCB-1 formula
-    def __init__(self, param, parent=None):
+    # table is an optional TranspositionTable; when set, children reached through
+    # different move orders but ending in the same position share their stats
+    # debug keeps every rollout result so print_tree can show them
+    # horizon is an optional RolloutHorizon where rollouts stop and are evaluated, children inherit it
+    # lethal is an optional LethalSolver that rollouts ask once per turn, children inherit it too
+    def __init__(self, param, parent=None, table=None, stats=None, debug=False, horizon=None, lethal=None):
         self.children = {}
         self.parent = parent
-        self.results = []
-        self.visits = 0  # Add this line
+        self.stats = stats if stats is not None else NodeStats(debug)
         self.param = param
+        self.table = table
+        self.debug = debug
+        self.horizon = horizon if horizon is not None or parent is None else parent.horizon
+        self.lethal = lethal if lethal is not None or parent is None else parent.lethal
     
     # REQUIRED function
     # Called once per iteration
@@ -40,19 +127,20 @@ class TreeNode:
         best_action = None
         best_score = float('-inf')
         for action in available_actions:
-            if action in self.children and self.children[action].results:
-                average_score = sum(self.children[action].results) / len(self.children[action].results)
+            if action in self.children and self.children[action].stats.visits > 0:
+                average_score = self.children[action].stats.get_mean()
                 if average_score > best_score:
                     best_score = average_score
                     best_action = action
         if best_action is None and available_actions:
-            best_action = random.choice(available_actions)
+            best_action = state.rng.choice(available_actions)
         return best_action
         
     # REQUIRED function (implementation optional, but *very* helpful for debugging)
     # Called after all iterations when the -v command line parameter is present
     def print_tree(self, indent = 0):
-        print(f"{' ' * indent}Results: {self.results}, Children: {len(self.children)}")
+        results = self.stats.samples if self.stats.samples is not None else self.stats
+        print(f"{' ' * indent}Results: {results}, Children: {len(self.children)}")
         for action, child in self.children.items():
             print(f"{' ' * (indent + 2)}Action: {action}")
             child.print_tree(indent + 4)
@@ -74,14 +162,14 @@ class TreeNode:
 
         # UCB-1 implementation below
         ucb_values = {}
-        total_visits = self.visits
+        total_visits = self.stats.visits
         log_total = math.log(total_visits) if total_visits > 0 else 0
         for action, child in self.children.items():
-            n = child.visits
+            n = child.stats.visits
             if n == 0:
                 ucb_values[action] = float('inf')
             else:
-                average = sum(child.results) / n
+                average = child.stats.get_mean()
                 ucb_values[action] = average + self.param * math.sqrt(log_total / n)
 
         if not ucb_values:
@@ -94,14 +182,9 @@ class TreeNode:
             return
         best_child = self.children[best_action]
 
-        next_state = deepcopy(state)
-        # Find the equivalent action in the copied state
-        actions = next_state.get_actions()
-        for a in actions:
-            if a == best_action:
-                next_state.step(a)
-                best_child.select(next_state)
-                break
+        # the state belongs to this iteration, so it is advanced in place instead of copied
+        state.step(best_action)
+        best_child.select(state)
 
     # RECOMMENDED: expand takes the available actions, and picks one at random,
     # adds a child node corresponding to that action, applies the action ot the state
@@ -110,20 +193,32 @@ class TreeNode:
         unexplored_actions = [a for a in available if a not in self.children]
         if not unexplored_actions:
             return
-        action = random.choice(unexplored_actions)
-        self.children[action] = TreeNode(self.param, self)
-        next_state = deepcopy(state)
-        next_state.step(action)
-        self.children[action].rollout(next_state)
+        action = state.rng.choice(unexplored_actions)
+        state.step(action)
+        stats = self.table.get(state.get_hash(), NodeStats(self.debug)) if self.table is not None else None
+        self.children[action] = TreeNode(self.param, self, self.table, stats, self.debug)
+        self.children[action].rollout(state)
         
     # RECOMMENDED: rollout plays the game randomly until its conclusion, and then 
     # calls backpropagate with the result you get 
     # current version uses a heuristic instead of making random decisions
     def rollout(self, state):
+        start_turn = state.turn
+        steps = 0
+        lethal_turn = None
         while not state.ended():
+            if self.horizon is not None and self.horizon.reached(state, start_turn, steps):
+                self.backpropagate(self.horizon.evaluator(state))
+                return
+            if self.lethal is not None and state.turn != lethal_turn:
+                lethal_turn = state.turn
+                line = self.lethal.solve(state, 'rollout', verify=False)
+                if line is not None and LethalSolver.play(state, line):
+                    break
+            steps += 1
             actions = state.get_actions()
             # best_action prefers to damage the player, random if it can't
-            best_action = max(actions, key=lambda a: getattr(a, 'damage', 0), default=random.choice(actions))
+            best_action = max(actions, key=lambda a: getattr(a, 'damage', 0), default=state.rng.choice(actions))
             state.step(best_action)
         result = self.score(state)
         self.backpropagate(result)
@@ -131,11 +226,9 @@ class TreeNode:
         
     # RECOMMENDED: backpropagate records the score you got in the current node, and 
     # then recursively calls the parent's backpropagate as well.
-    # If you record scores in a list, you can use sum(self.results)/len(self.results)
-    # to get an average.
+    # Scores are accumulated in self.stats, use self.stats.get_mean() to get an average.
     def backpropagate(self, result):
-        self.results.append(result)
-        self.visits += 1  # Increment visits
+        self.stats.add(result)
         if self.parent is not None:
             self.parent.backpropagate(result)
         
@@ -143,37 +236,264 @@ class TreeNode:
     # RECOMMENDED: You can start by just using state.score() as the actual value you are 
     # optimizing for the challenge scenario, in particular, you may want to experiment
     # with other options (e.g. squaring the score, or incorporating state.health(), etc.)
-    def score(self, state): 
+    def score(self, state):
         return state.score()
-        
-        
+
+
+# TreeNode shared by several threads searching the same tree (tree parallelization).
+# Each node guards its children and stats with its own lock. A thread descending through a
+# node adds a virtual loss (a visit without a result, scores are in [0, 1]) so that concurrent
+# threads spread over different branches; backpropagation replaces it with the real result.
+# The transposition table is not used here.
+class ThreadedTreeNode(TreeNode):
+    def __init__(self, param, parent=None, debug=False, horizon=None, lethal=None):
+        super().__init__(param, parent, None, None, debug, horizon, lethal)
+        self.lock = threading.Lock()
+
+    def add_virtual_loss(self):
+        with self.lock:
+            self.stats.visits += 1
+
+    def select(self, state):
+        if state is None or state.ended():
+            return
+        self.add_virtual_loss()
+        node = self
+        while True:
+            available_actions = state.get_actions()
+            with node.lock:
+                unexplored_actions = [a for a in available_actions if a not in node.children]
+                if unexplored_actions:
+                    action = state.rng.choice(unexplored_actions)
+                    child = self.__class__(self.param, node, self.debug)
+                    node.children[action] = child
+                else:
+                    action = node.get_ucb_action(available_actions)
+                    child = node.children.get(action) if action is not None else None
+            if child is None:
+                # nothing left to try, the virtual losses are taken back without a result
+                node.backpropagate(None)
+                return
+            child.add_virtual_loss()
+            state.step(action)
+            if unexplored_actions or state.ended():
+                child.rollout(state)
+                return
+            node = child
+
+    def get_ucb_action(self, available_actions):
+        log_total = math.log(self.stats.visits) if self.stats.visits > 0 else 0
+        best_action = None
+        best_ucb = float('-inf')
+        for action in available_actions:
+            stats = self.children[action].stats
+            if stats.visits == 0:
+                return action
+            ucb = stats.get_mean() + self.param * math.sqrt(log_total / stats.visits)
+            if ucb > best_ucb:
+                best_ucb = ucb
+                best_action = action
+        return best_action
+
+    def backpropagate(self, result):
+        node = self
+        while node is not None:
+            with node.lock:
+                node.stats.visits -= 1
+                if result is not None:
+                    node.stats.add(result)
+            node = node.parent
+
+
+# Runs in a worker process: one independent determinized search with its own random stream,
+# returning only the statistics of the root's children (lethal is a copy, its rollout counts stay in the worker)
+def search_root(battle_state: BattleState, iterations: int, param: float, transposition: int, seed: int, horizon: RolloutHorizon|None = None, lethal: LethalSolver|None = None) -> dict[GameAction, NodeStats]:
+    rng = random.Random(seed)
+    table = TranspositionTable(transposition) if transposition > 0 else None
+    t = TreeNode(param, table=table, horizon=horizon, lethal=lethal)
+    for i in range(iterations):
+        t.step(battle_state.copy_undeterministic(rng=rng))
+    return {action: child.stats for action, child in t.children.items()}
+
+# visits both children compared by MCTSAgent's early stop need before their variances are used,
+# and the difference of their means it ignores
+EARLY_STOP_MIN_VISITS = 20
+EARLY_STOP_TOLERANCE = 0.01
+
 # You do not have to modify the MCTS Agent (but you can)
 class MCTSAgent(GGPA):
-    def __init__(self, iterations: int, verbose: bool, param: float):
+    # transposition is the capacity of the transposition table, 0 disables it
+    # reuse_tree keeps the subtree of the chosen action as the root of the next decision
+    # workers > 1 splits the iterations over several searches, tree reuse is not used then:
+    # parallel='root' runs independent searches in a process pool and merges their root statistics,
+    # parallel='tree' runs threads on one shared tree (only faster on free-threaded Python)
+    # horizon, when given, cuts the rollouts short (see RolloutHorizon)
+    # lethal plays a win found by the LethalSolver right away, and the rollouts finish with one when they can
+    # determinizations > 0 draws that many orders of the hidden draw pile per decision (information-set MCTS),
+    # the iterations take turns over them instead of shuffling a copy each; only used with one worker
+    # early_stop > 0 ends the search of a decision before iterations (then a hard cap) as soon as the best root child is
+    # early_stop standard errors above the runner-up, or the iterations left cannot change get_best's answer; only with one worker.
+    # The iterations run per searched decision are kept in metadata['iterations']
+    def __init__(self, iterations: int, verbose: bool, param: float, transposition: int = 0, reuse_tree: bool = True, workers: int = 1, parallel: str = 'root', horizon: RolloutHorizon|None = None, lethal: bool = False, determinizations: int = 0, early_stop: float = 0):
+        super().__init__("MCTS")
         self.iterations = iterations
         self.verbose = verbose
         self.param = param
+        self.transposition = transposition
+        self.table = TranspositionTable(transposition) if transposition > 0 else None
+        self.reuse_tree = reuse_tree and workers == 1
+        self.next_root: TreeNode|None = None
+        self.next_root_hash: int|None = None
+        self.metadata['reused_visits'] = []
+        self.workers = workers
+        self.parallel = parallel
+        self.pool: ProcessPoolExecutor|None = None
+        self.horizon = horizon
+        self.lethal = LethalSolver() if lethal else None
+        self.determinizations = determinizations
+        self.early_stop = early_stop
+        self.metadata['iterations'] = []
+
+    # the agent travels to the workers inside the battle state, without its pool and search trees
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['next_root'] = None
+        state['table'] = None
+        return state
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _search_parallel(self, battle_state: BattleState) -> TreeNode:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        seeds = [battle_state.split_seed() for _ in range(self.workers)]
+        budgets = [self.iterations // self.workers + (1 if i < self.iterations % self.workers else 0) for i in range(self.workers)]
+        futures = [self.pool.submit(search_root, battle_state, budget, self.param, self.transposition, seed, self.horizon, self.lethal) for budget, seed in zip(budgets, seeds)]
+        t = TreeNode(self.param, debug=self.verbose)
+        for future in futures:
+            for action, stats in future.result().items():
+                if action not in t.children:
+                    t.children[action] = TreeNode(self.param, t, debug=self.verbose)
+                t.children[action].stats.merge(stats)
+                t.stats.merge(stats)
+        return t
+
+    # every thread gets its own random stream, so the threads share nothing mutable but the tree
+    def _search_threads(self, battle_state: BattleState) -> TreeNode:
+        t = ThreadedTreeNode(self.param, debug=self.verbose, horizon=self.horizon, lethal=self.lethal)
+        budgets = [self.iterations // self.workers + (1 if i < self.iterations % self.workers else 0) for i in range(self.workers)]
+        def search(budget: int, rng: random.Random):
+            for i in range(budget):
+                t.step(battle_state.copy_undeterministic(rng=rng))
+        threads = [threading.Thread(target=search, args=(budget, battle_state.split_rng())) for budget in budgets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return t
+
+    # the orders of the draw pile, as permutations of its indices so that no cards are copied to draw them
+    def _get_determinizations(self, battle_state: BattleState, rng: random.Random) -> list[list[int]]:
+        orders = []
+        for i in range(self.determinizations):
+            order = list(range(len(battle_state.draw_pile)))
+            rng.shuffle(order)
+            orders.append(order)
+        return orders
+
+    # Results are in [0, 1]: the best child's mean cannot drop below its total over visits + remaining, nor can another's
+    # rise above (total + remaining) / (visits + remaining). Below EARLY_STOP_MIN_VISITS the variance is not trusted,
+    # and a runner-up that can only be EARLY_STOP_TOLERANCE better is as good a choice.
+    def _can_stop(self, root: TreeNode, actions: list[GameAction], remaining: int) -> bool:
+        stats = [root.children[action].stats for action in actions if action in root.children]
+        if len(stats) < len(actions) or any(s.visits == 0 for s in stats):
+            return False
+        stats.sort(key=NodeStats.get_mean, reverse=True)
+        best, others = stats[0], stats[1:]
+        lowest = best.total / (best.visits + remaining)
+        if all((s.total + remaining) / (s.visits + remaining) < lowest for s in others):
+            return True
+        runner_up = others[0]
+        if min(best.visits, runner_up.visits) < EARLY_STOP_MIN_VISITS:
+            return False
+        return (best.get_mean() - self.early_stop * math.sqrt(best.get_variance() / best.visits) + EARLY_STOP_TOLERANCE
+                > runner_up.get_mean() + self.early_stop * math.sqrt(runner_up.get_variance() / runner_up.visits))
+
+    # The kept subtree is only used if the observed state is the one it was expected to lead to
+    def _get_root(self, battle_state: BattleState) -> TreeNode:
+        root, self.next_root = self.next_root, None
+        if root is not None and battle_state.get_hash() == self.next_root_hash:
+            self.metadata['reused_visits'].append(root.stats.visits)
+            return root
+        self.metadata['reused_visits'].append(0)
+        return self._make_root()
+
+    def _make_root(self) -> TreeNode:
+        return TreeNode(self.param, table=self.table, debug=self.verbose, horizon=self.horizon, lethal=self.lethal)
+
+    # The expected hash comes from playing the action on a throwaway clone, with its own generator
+    # so that the probe does not split a seed from the state it was cloned from
+    def _keep_subtree(self, root: TreeNode, action, battle_state: BattleState):
+        child = root.children.get(action)
+        if child is None:
+            return
+        probe = battle_state.clone(rng=random.Random(0))
+        probe.step(action)
+        self.next_root_hash = probe.get_hash()
+        child.parent = None
+        self.next_root = child
 
     # REQUIRED METHOD
     def choose_card(self, game_state: GameState, battle_state: BattleState) -> PlayCard | EndAgentTurn:
         actions = battle_state.get_actions()
         if len(actions) == 1:
+            self.next_root = None
             return actions[0].to_action(battle_state)
+        if self.lethal is not None:
+            line = self.lethal.solve(battle_state)
+            if line is not None:
+                self.next_root = None
+                return line[0].to_action(battle_state)
     
-        t = TreeNode(self.param)
         start_time = time.time()
-
-        for i in range(self.iterations):
-            sample_state = battle_state.copy_undeterministic()
-            t.step(sample_state)
+        used = self.iterations
+        if self.workers > 1 and self.parallel == 'tree':
+            t = self._search_threads(battle_state)
+        elif self.workers > 1:
+            t = self._search_parallel(battle_state)
+        else:
+            t = self._get_root(battle_state)
+            # all iterations share one stream split from the battle's
+            rng = battle_state.split_rng()
+            orders = self._get_determinizations(battle_state, rng)
+            for i in range(self.iterations):
+                if orders:
+                    sample_state = battle_state.copy_determinized(orders[i % len(orders)], rng=rng)
+                else:
+                    sample_state = battle_state.copy_undeterministic(rng=rng)
+                t.step(sample_state)
+                if self.early_stop > 0 and self._can_stop(t, actions, self.iterations - i - 1):
+                    used = i + 1
+                    break
+        self.metadata['iterations'].append(used)
         
         best_action = t.get_best(battle_state)
         if self.verbose:
             t.print_tree()
+            if self.reuse_tree:
+                print(f"reused {self.metadata['reused_visits'][-1]} visits from the previous decision")
+            if self.table is not None:
+                print(self.table)
+        if self.reuse_tree and best_action is not None:
+            self._keep_subtree(t, best_action, battle_state)
         
         if best_action is None:
             print("WARNING: MCTS did not return any action")
-            return random.choice(self.get_choose_card_options(game_state, battle_state)) # fallback option
+            return battle_state.rng.choice(self.get_choose_card_options(game_state, battle_state)) # fallback option
         return best_action.to_action(battle_state)
     
     # REQUIRED METHOD: All our scenarios only have one enemy
@@ -0,0 +1,65 @@
+from __future__ import annotations
+import math
+from ggpa.mcts_bot import TreeNode, MCTSAgent
+from ggpa.evaluation import RolloutHorizon
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from action.game_action import GameAction
+
+# TreeNode of an open-loop search: a node stands for the actions that lead to it, whatever cards were drawn,
+# reshuffled or enemy moves were rolled on the way, and keeps only statistics.
+# Every iteration plays its own determinization (the copy of the state passed to step) down the tree, so the draws
+# and the RandomizedItemSet moves of the enemies are sampled anew from the shared stream each time.
+# The actions of a node then differ between iterations: a child only competes when its action is available,
+# and its exploration term counts the times it was available instead of the visits of the parent (subset-armed UCB).
+# An iteration that reaches the end of the battle in the tree still counts, with the final score.
+class OpenLoopNode(TreeNode):
+    def __init__(self, param, parent=None, debug=False, horizon=None, lethal=None):
+        super().__init__(param, parent, None, None, debug, horizon, lethal)
+        # times the parent was visited with this node's action available
+        self.available = 0
+
+    def select(self, state):
+        node = self
+        while not state.ended():
+            available_actions = state.get_actions()
+            unexplored_actions = []
+            for action in available_actions:
+                child = node.children.get(action)
+                if child is None:
+                    unexplored_actions.append(action)
+                else:
+                    child.available += 1
+            if unexplored_actions:
+                action = state.rng.choice(unexplored_actions)
+                child = self.__class__(self.param, node, self.debug)
+                child.available = 1
+                node.children[action] = child
+                state.step(action)
+                child.rollout(state)
+                return
+            action = node.get_ucb_action(available_actions)
+            state.step(action)
+            node = node.children[action]
+        node.backpropagate(node.score(state))
+
+    def get_ucb_action(self, available_actions: list[GameAction]) -> GameAction:
+        best_action = available_actions[0]
+        best_ucb = float('-inf')
+        for action in available_actions:
+            child = self.children[action]
+            ucb = child.stats.get_mean() + self.param * math.sqrt(math.log(child.available) / child.stats.visits)
+            if ucb > best_ucb:
+                best_ucb = ucb
+                best_action = action
+        return best_action
+
+# MCTSAgent searching an open-loop tree (see OpenLoopNode), on one process and without a transposition table:
+# the positions of an open-loop node differ from one iteration to the next
+class OpenLoopAgent(MCTSAgent):
+    def __init__(self, iterations: int, verbose: bool, param: float, reuse_tree: bool = True, horizon: RolloutHorizon|None = None, lethal: bool = False, determinizations: int = 0, early_stop: float = 0):
+        super().__init__(iterations, verbose, param, 0, reuse_tree, 1, 'root', horizon, lethal, determinizations, early_stop)
+        self.name = "OpenLoopMCTS"
+
+    def _make_root(self) -> TreeNode:
+        return OpenLoopNode(self.param, debug=self.verbose, horizon=self.horizon, lethal=self.lethal)
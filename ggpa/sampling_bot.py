@@ -8,9 +8,10 @@ from card import Card
 from action.action import EndAgentTurn, PlayCard
 from game import GameState
 from ggpa.ggpa import GGPA
+from ggpa.evaluation import RolloutHorizon
+from ggpa.lethal import LethalSolver
 from config import Verbose
 from typing import TYPE_CHECKING
-import random
 if TYPE_CHECKING:
     from game import GameState
     from battle import BattleState
@@ -19,23 +20,38 @@ if TYPE_CHECKING:
 
 
 class Sampler:
-    def __init__(self):
+    # horizon is an optional RolloutHorizon where rollouts stop and are evaluated,
+    # lethal an optional LethalSolver that rollouts ask once per turn
+    def __init__(self, horizon: RolloutHorizon|None = None, lethal: LethalSolver|None = None):
         self.results = {}
+        self.horizon = horizon
+        self.lethal = lethal
     def sample(self, state):
         actions = state.get_actions()
         if not actions:
             return 
-        action = random.choice(actions)
+        action = state.rng.choice(actions)
         if action.key() not in self.results:
             self.results[action.key()] = []
-        expansion_state = state.copy_undeterministic()
+        expansion_state = state.copy_undeterministic(rng=state.rng)
         expansion_state.step(action)
         score = self.rollout(expansion_state)
         self.results[action.key()].append(score)
             
     def rollout(self, state):
+        start_turn = state.turn
+        steps = 0
+        lethal_turn = None
         while not state.ended():
-            action = random.choice(state.get_actions())
+            if self.horizon is not None and self.horizon.reached(state, start_turn, steps):
+                return self.horizon.evaluator(state)
+            if self.lethal is not None and state.turn != lethal_turn:
+                lethal_turn = state.turn
+                line = self.lethal.solve(state, 'rollout', verify=False)
+                if line is not None and LethalSolver.play(state, line):
+                    break
+            steps += 1
+            action = state.rng.choice(state.get_actions())
             state.step(action)
         return state.score()
         
@@ -58,17 +74,26 @@ class Sampler:
             
         
 class SamplingAgent(GGPA):
-    def __init__(self, seed: int, iterations: int, verbose: bool):
+    # lethal plays a win found by the LethalSolver right away, and the rollouts finish with one when they can
+    # the samples of a decision come from a stream split from the battle's, so the battle's seed decides them
+    def __init__(self, iterations: int, verbose: bool, horizon: RolloutHorizon|None = None, lethal: bool = False):
         self.iterations = iterations
+        self.horizon = horizon
+        self.lethal = LethalSolver() if lethal else None
         self.verbose = verbose
-        self.random = random.Random(seed)
 
     def choose_card(self, game_state: GameState, battle_state: BattleState) -> PlayCard | EndAgentTurn:
-        t = Sampler()
+        if self.lethal is not None:
+            line = self.lethal.solve(battle_state)
+            if line is not None:
+                return line[0].to_action(battle_state)
+        t = Sampler(self.horizon, self.lethal)
         start_time = time.time()
 
+        # all samples of a decision share one stream split from the battle's
+        rng = battle_state.split_rng()
         for i in range(self.iterations):
-            sample_state = battle_state.copy_undeterministic()
+            sample_state = battle_state.copy_undeterministic(rng=rng)
             t.sample(sample_state)
             
         if self.verbose:
@@ -85,8 +110,8 @@ class SamplingAgent(GGPA):
         return card_list[0]
         
     def __deepcopy__(self, memo):
-        result = SamplingAgent(0, self.iterations, self.verbose)
-        result.random = deepcopy(self.random, memo)
+        result = SamplingAgent(self.iterations, self.verbose, self.horizon)
+        result.lethal = self.lethal
         return result
         
         
\ No newline at end of file
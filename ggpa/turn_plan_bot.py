@@ -0,0 +1,179 @@
+from __future__ import annotations
+import math
+import random
+from action.game_action import GameAction
+from ggpa.ggpa import GGPA
+from ggpa.mcts_bot import TreeNode
+from ggpa.evaluation import RolloutHorizon
+from ggpa.lethal import LethalSolver
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from game import GameState
+    from battle import BattleState
+    from agent import Agent
+    from card import Card
+    from action.action import EndAgentTurn, PlayCard
+
+# A turn plan is the cards played in one player turn, after which the turn ends (unless the battle ended).
+# Plans that leave the battle in the same position (the same BattleState.get_hash()) have the same effect
+# whatever their order, so only one of them is kept: the first in the order of the card names.
+TurnPlan = tuple[GameAction, ...]
+MAX_PLANS = 256
+
+# The distinct plans from the current position, found by playing every order of the cards on the state
+# itself and undoing them (see BattleState.begin_journal), which leaves the state as it was.
+# Also returns whether a plan draws cards, the plans then depend on the order of the draw pile.
+def get_turn_plans(state: BattleState, max_plans: int = MAX_PLANS) -> tuple[list[TurnPlan], bool]:
+    plans: list[TurnPlan] = []
+    seen: set[int] = set()
+    draw_pile = list(state.draw_pile)
+    draws = False
+    journal = state.journal
+    state.begin_journal()
+    def visit(plan: TurnPlan):
+        nonlocal draws
+        key = state.get_hash()
+        if key in seen or len(plans) >= max_plans:
+            return
+        seen.add(key)
+        plans.append(plan)
+        draws = draws or state.draw_pile != draw_pile
+        if state.ended():
+            return
+        for action in sorted(state.get_actions(), key=lambda a: a.card or ("", 0)):
+            if action.card is None:
+                continue
+            state.step(action)
+            visit(plan + (action,))
+            state.undo()
+    visit(())
+    state.journal = journal
+    return plans, draws
+
+# A plan that draws after a reshuffle depends on the random state it is played with, so its cards are only
+# played for as long as they are in the hand.
+def play_turn_plan(state: BattleState, plan: TurnPlan):
+    for action in plan:
+        if state.ended() or action not in state.get_actions():
+            break
+        state.step(action)
+    if not state.ended():
+        state.step(GameAction())
+
+def describe_turn_plan(plan: TurnPlan) -> str:
+    return ", ".join([str(action) for action in plan] + ["End Turn"])
+
+# TreeNode whose children are turn plans, so that every level of the tree is one player turn.
+# The leaves are played out by TreeNode.rollout, with the horizon and lethal solver of the root.
+class TurnPlanNode(TreeNode):
+    def __init__(self, param, parent=None, debug=False, horizon=None, lethal=None):
+        super().__init__(param, parent, None, None, debug, horizon, lethal)
+        # the plans of the positions seen at this node, unless they draw cards
+        self.plans: dict[int, list[TurnPlan]] = {}
+
+    def get_plans(self, state: BattleState) -> list[TurnPlan]:
+        key = state.get_hash()
+        plans = self.plans.get(key)
+        if plans is None:
+            plans, draws = get_turn_plans(state)
+            if not draws:
+                self.plans[key] = plans
+        return plans
+
+    def select(self, state):
+        if state.ended():
+            self.backpropagate(self.score(state))
+            return
+        plans = self.get_plans(state)
+        unexplored = [plan for plan in plans if plan not in self.children]
+        if unexplored:
+            plan = state.rng.choice(unexplored)
+            play_turn_plan(state, plan)
+            self.children[plan] = self.__class__(self.param, self, self.debug)
+            self.children[plan].rollout(state)
+            return
+        # only the plans of this determinization compete, the others may not be possible with its draws
+        log_total = math.log(self.stats.visits) if self.stats.visits > 0 else 0
+        best_plan = max(plans, key=lambda plan: self.children[plan].stats.get_mean() + self.param * math.sqrt(log_total / self.children[plan].stats.visits))
+        play_turn_plan(state, best_plan)
+        self.children[best_plan].select(state)
+
+    def get_best(self, state):
+        best_plan = None
+        best_score = float('-inf')
+        for plan in self.get_plans(state):
+            child = self.children.get(plan)
+            if child is not None and child.stats.visits > 0 and child.stats.get_mean() > best_score:
+                best_score = child.stats.get_mean()
+                best_plan = plan
+        return best_plan
+
+    def print_tree(self, indent = 0):
+        results = self.stats.samples if self.stats.samples is not None else self.stats
+        print(f"{' ' * indent}Results: {results}, Children: {len(self.children)}")
+        for plan, child in self.children.items():
+            print(f"{' ' * (indent + 2)}Plan: {describe_turn_plan(plan)}")
+            child.print_tree(indent + 4)
+
+# MCTS over whole turns: the search picks a turn plan, whose cards are then played one decision at a time.
+# The plan is followed for as long as the battle is where it was expected to be; a card draw that
+# changes the hand (or anything else) makes the agent search again from there.
+class TurnPlanAgent(GGPA):
+    def __init__(self, iterations: int, verbose: bool, param: float, horizon: RolloutHorizon|None = None, lethal: bool = False):
+        super().__init__("TurnPlan")
+        self.iterations = iterations
+        self.verbose = verbose
+        self.param = param
+        self.horizon = horizon
+        self.lethal = LethalSolver() if lethal else None
+        # the actions left of the plan, with the hash the battle is expected to have before each of them
+        self.plan: list[GameAction] = []
+        self.plan_hashes: list[int] = []
+        self.metadata['searches'] = 0
+
+    def _search(self, battle_state: BattleState) -> TurnPlan|None:
+        t = TurnPlanNode(self.param, debug=self.verbose, horizon=self.horizon, lethal=self.lethal)
+        # all iterations share one stream split from the battle's
+        rng = battle_state.split_rng()
+        for i in range(self.iterations):
+            t.step(battle_state.copy_undeterministic(rng=rng))
+        self.metadata['searches'] += 1
+        best_plan = t.get_best(battle_state.copy_undeterministic(rng=rng))
+        if self.verbose:
+            t.print_tree()
+        return best_plan
+
+    def _follow(self, battle_state: BattleState, plan: list[GameAction]):
+        probe = battle_state.copy_undeterministic(rng=random.Random(0))
+        self.plan = []
+        self.plan_hashes = []
+        for action in plan:
+            if probe.ended() or action not in probe.get_actions():
+                break
+            self.plan.append(action)
+            self.plan_hashes.append(probe.get_hash())
+            probe.step(action)
+
+    def choose_card(self, game_state: GameState, battle_state: BattleState) -> PlayCard | EndAgentTurn:
+        actions = battle_state.get_actions()
+        if self.lethal is not None and len(actions) > 1:
+            line = self.lethal.solve(battle_state)
+            if line is not None:
+                self._follow(battle_state, line)
+        if not self.plan or self.plan_hashes[0] != battle_state.get_hash() or self.plan[0] not in actions:
+            self.plan = []
+            if len(actions) == 1:
+                return actions[0].to_action(battle_state)
+            best_plan = self._search(battle_state)
+            if best_plan is None:
+                print("WARNING: MCTS did not return any action")
+                return battle_state.rng.choice(self.get_choose_card_options(game_state, battle_state))
+            self._follow(battle_state, list(best_plan) + [GameAction()])
+        self.plan_hashes.pop(0)
+        return self.plan.pop(0).to_action(battle_state)
+
+    def choose_agent_target(self, battle_state: BattleState, list_name: str, agent_list: list[Agent]) -> Agent:
+        return agent_list[0]
+
+    def choose_card_target(self, battle_state: BattleState, list_name: str, card_list: list[Card]) -> Card:
+        return card_list[0]
@@ -0,0 +1,127 @@
+from __future__ import annotations
+import functools
+import threading
+import time
+
+# Opt-in call counters and timers for the hot operations of the engine and the MCTS bot.
+# Nothing is wrapped until enable() is called and disable() puts the original methods back,
+# so the engine runs exactly the same code as without instrumentation when it is off.
+# Times are inclusive (select contains the rollouts it starts, decision contains everything)
+# and nested calls of an operation are only timed once, at the outermost call. A decision starts
+# afresh, so e.g. the enemy turns a bot simulates are timed although the game's turn is running.
+class Instrumentation:
+    def __init__(self):
+        self.calls: dict[str, int] = {}
+        self.seconds: dict[str, float] = {}
+        self.local = threading.local()
+        self.wrapped: list[tuple[type, str, object]] = []
+        self.decision_start: tuple[dict[str, int], dict[str, float]]|None = None
+        # called with the summary of every decision while enabled
+        self.on_decision = None
+
+    @staticmethod
+    def get_targets():
+        from battle import BattleState
+        from agent import Player
+        from utility import Event
+        from ggpa.mcts_bot import TreeNode, ThreadedTreeNode
+        from ggpa.turn_plan_bot import TurnPlanNode
+        from ggpa.open_loop_bot import OpenLoopNode
+        return [
+            ('clone', BattleState, 'clone'),
+            ('copy_undeterministic', BattleState, 'copy_undeterministic'),
+            ('step', BattleState, 'step'),
+            ('tick_player', BattleState, 'tick_player'),
+            ('get_actions', BattleState, 'get_actions'),
+            ('play_side', BattleState, '_play_side'),
+            ('broadcast', Event, 'broadcast_before'),
+            ('broadcast', Event, 'broadcast_after'),
+            ('broadcast', Event, 'broadcast_apply'),
+            ('mcts_select', TreeNode, 'select'),
+            ('mcts_select', ThreadedTreeNode, 'select'),
+            ('mcts_select', TurnPlanNode, 'select'),
+            ('mcts_select', OpenLoopNode, 'select'),
+            ('mcts_rollout', TreeNode, 'rollout'),
+            ('decision', Player, '_get_action'),
+        ]
+
+    def is_enabled(self) -> bool:
+        return len(self.wrapped) > 0
+
+    def enable(self):
+        if self.is_enabled():
+            return
+        for name, cls, method_name in Instrumentation.get_targets():
+            original = cls.__dict__[method_name]
+            self.wrapped.append((cls, method_name, original))
+            setattr(cls, method_name, self._wrap(name, original))
+
+    def disable(self):
+        for cls, method_name, original in reversed(self.wrapped):
+            setattr(cls, method_name, original)
+        self.wrapped = []
+
+    def reset(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def _wrap(self, name: str, func):
+        instrumentation = self
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            running = getattr(instrumentation.local, 'running', None)
+            if running is None:
+                running = instrumentation.local.running = set()
+            if name in running:
+                instrumentation.calls[name] = instrumentation.calls.get(name, 0) + 1
+                return func(*args, **kwargs)
+            if name == 'decision':
+                instrumentation.decision_start = (dict(instrumentation.calls), dict(instrumentation.seconds))
+                instrumentation.local.running = {name}
+            else:
+                running.add(name)
+            instrumentation.calls[name] = instrumentation.calls.get(name, 0) + 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                instrumentation.seconds[name] = instrumentation.seconds.get(name, 0) + time.perf_counter() - start
+                if name == 'decision':
+                    instrumentation.local.running = running
+                    if instrumentation.on_decision is not None:
+                        instrumentation.on_decision(instrumentation.get_decision_summary())
+                else:
+                    running.discard(name)
+        return wrapper
+
+    # counts and times of every operation, share is its time over total (the decision time by default)
+    @staticmethod
+    def summarize(calls: dict[str, int], seconds: dict[str, float], total: float|None = None) -> dict:
+        if total is None:
+            total = seconds.get('decision', 0)
+        return {
+            'total_seconds': total,
+            'operations': {name: {
+                'calls': calls[name],
+                'seconds': seconds.get(name, 0),
+                'share': seconds.get(name, 0) / total if total > 0 else 0,
+            } for name in sorted(calls)},
+        }
+
+    def get_summary(self, total: float|None = None) -> dict:
+        return Instrumentation.summarize(self.calls, self.seconds, total)
+
+    # the operations since the start of the last decision
+    def get_decision_summary(self) -> dict:
+        start_calls, start_seconds = self.decision_start if self.decision_start is not None else ({}, {})
+        calls = {name: count - start_calls.get(name, 0) for name, count in self.calls.items() if count > start_calls.get(name, 0)}
+        seconds = {name: self.seconds.get(name, 0) - start_seconds.get(name, 0) for name in calls}
+        return Instrumentation.summarize(calls, seconds)
+
+    # e.g. "62.0% of decision time in clone"
+    @staticmethod
+    def describe(summary: dict, of: str = "decision") -> list[str]:
+        operations = sorted(summary['operations'].items(), key=lambda item: -item[1]['seconds'])
+        return [f"{operation['share']*100:.1f}% of {of} time in {name} ({operation['calls']} calls)" for name, operation in operations if name != of]
+
+instrumentation = Instrumentation()
@@ -9,9 +9,17 @@ import random
 from ggpa.human_input import HumanInput
 from ggpa.backtrack import BacktrackBot
 from ggpa.mcts_bot import MCTSAgent
+from ggpa.turn_plan_bot import TurnPlanAgent
+from ggpa.open_loop_bot import OpenLoopAgent
 from ggpa.random_bot import RandomAgent
 from ggpa.sampling_bot import SamplingAgent
+from ggpa.evaluation import RolloutHorizon, EVALUATORS
+from instrumentation import Instrumentation, instrumentation
+from game_trace import TraceWriter
 import argparse
+import functools
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 def get_scenario(name):
     if name == "intro":
@@ -27,37 +35,115 @@ def get_scenario(name):
     if name == "boss":
         return (65, ["Strike", "Strike", "Defend", "Defend", "Bash", "Bludgeon", "Thunderclap", "Inflame", "PommelStrike", "Offering"], "Donut")
 
-def main(scenario, n, verbose, bot, games, param, israndom):
+# decks are built once per process, every battle gets its own copies of the cards
+@functools.cache
+def get_scenario_deck(scenario):
+    return CardRepo.make_deck(get_scenario(scenario)[1])
+
+# the same seed gives the same enemy and battle random stream, whatever the bot; None picks a random seed
+def make_battle_state(scenario, player, verbose=Verbose.NO_LOG, seed=None, log_filename=None, log_thread=False):
+    hp, deck, enemy = get_scenario(scenario)
+    game_state = GameState(Character.IRON_CLAD, player, 0, hp)
+    game_state.set_deck([card.clone() for card in get_scenario_deck(scenario)])
+    rng = random.Random(seed)
+    return BattleState(game_state, agent.make_enemy(enemy, game_state, rng), verbose=verbose, seed=rng.getrandbits(64), log_filename=log_filename, log_thread=log_thread)
+
+BOT_NAMES = {"mcts": "MCTS", "turnplan": "Turn plan MCTS", "openloop": "Open-loop MCTS", "random": "Random", "human": "Human"}
+
+def make_player(i, bot, n, verbose, param, transposition=0, reuse_tree=True, workers=1, parallel='root', horizon=None, lethal=False, determinizations=0, early_stop=0):
+    if bot == "mcts":
+        return MCTSAgent(n, verbose, param, transposition, reuse_tree, workers, parallel, horizon, lethal, determinizations, early_stop)
+    elif bot == "openloop":
+        return OpenLoopAgent(n, verbose, param, reuse_tree, horizon, lethal, determinizations, early_stop)
+    elif bot == "turnplan":
+        return TurnPlanAgent(n, verbose, param, horizon, lethal)
+    elif bot == "random":
+        return RandomAgent()
+    elif bot == "human":
+        return HumanInput(verbose)
+    return SamplingAgent(n, verbose, horizon, lethal)
+
+# Plays game i and returns its index, score, duration, the bot statistics to print,
+# when instrumenting a JSON record per decision followed by one for the game,
+# and when tracing the traced game (trace is a TraceWriter, or True to trace in memory)
+# log_file, when given, gets the log of game i in log_file_i.log instead of the console
+def play_game(scenario, i, verbose, seed, bot_args, instrument=False, log_file=None, log_thread=False, trace=None):
+    player = make_player(i, *bot_args)
+    if log_file is not None:
+        battle_state = make_battle_state(scenario, player, Verbose.LOG, seed, f"{log_file}_{i}", log_thread)
+    else:
+        battle_state = make_battle_state(scenario, player, verbose, seed)
+    trace_writer = TraceWriter() if trace is True else trace
+    battle_state.trace = trace_writer
+    records = []
+    if instrument:
+        instrumentation.enable()
+        instrumentation.reset()
+        instrumentation.on_decision = lambda summary: records.append({'game': i, 'decision': len(records), **summary})
+    start = time.time()
+    battle_state.run()
+    end = time.time()
+    notes = []
+    if instrument:
+        summary = instrumentation.get_summary(end - start)
+        records.append({'game': i, **summary})
+        notes += Instrumentation.describe(summary, "game")[:5]
+    if getattr(player, 'lethal', None) is not None:
+        notes.append(repr(player.lethal))
+    if isinstance(player, MCTSAgent):
+        if player.table is not None:
+            notes.append(repr(player.table))
+        player.close()
+        if player.reuse_tree:
+            reused_visits = player.metadata['reused_visits']
+            notes.append(f"reused {sum(reused_visits)} visits over {len([v for v in reused_visits if v > 0])}/{len(reused_visits)} decisions")
+        if player.early_stop > 0:
+            iterations = player.metadata['iterations']
+            budget = player.iterations * len(iterations)
+            notes.append(f"ran {sum(iterations)}/{budget} iterations over {len(iterations)} decisions ({(1 - sum(iterations) / budget) * 100 if budget > 0 else 0:.1f}% saved)")
+    return i, battle_state.score(), end - start, notes, records, trace_writer.get_games() if trace is True else None
+
+# Yields the results of games 0 to games-1, in the order they finish.
+# With jobs > 1 the games are spread over a process pool whose workers are reused for the whole batch,
+# so imports and scenario setup are paid once per worker. Game i is seeded with i either way.
+def run_games(scenario, games, verbose, israndom, bot_args, jobs=1, instrument=False, log_file=None, log_thread=False, trace=None):
+    seeds = [None if israndom else i for i in range(games)]
+    if jobs <= 1:
+        for i in range(games):
+            yield play_game(scenario, i, verbose, seeds[i], bot_args, instrument, log_file, log_thread, trace)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=get_scenario_deck, initargs=(scenario,)) as pool:
+        futures = [pool.submit(play_game, scenario, i, verbose, seeds[i], bot_args, instrument, log_file, log_thread, True if trace is not None else None) for i in range(games)]
+        for future in as_completed(futures):
+            yield future.result()
+
+# instrument is the name of a file that gets the instrumentation records as JSON lines,
+# trace the name of a game_trace file the games are appended to, horizon an optional RolloutHorizon for the bot's rollouts
+# lethal whether the bot uses the LethalSolver, determinizations the orders of the draw pile an MCTS decision shares
+# and early_stop the standard errors that end an MCTS search early (see MCTSAgent)
+def main(scenario, n, verbose, bot, games, param, israndom, transposition=0, reuse_tree=True, workers=1, parallel='root', jobs=1, instrument=None, log_file=None, log_thread=False, trace=None, horizon=None, lethal=False, determinizations=0, early_stop=0):
     scores = []
     wins = 0
-    agentname = ""
-    for i in range(games):
-        hp, deck, enemy = get_scenario(scenario)
-        if bot == "mcts":
-            agentname = "MCTS"
-            player = MCTSAgent(n, verbose, param)
-        elif bot == "random":
-            agentname = "Random"
-            player = RandomAgent()
-        elif bot == "human":
-            agentname = "Human"
-            player = HumanInput(verbose)
-        else:
-            agentname = "Sampling"
-            player = SamplingAgent(i, n, verbose)
-        if not israndom:
-            random.seed(i)
-        game_state = GameState(Character.IRON_CLAD, player, 0, hp)
-        game_state.set_deck(CardRepo.make_deck(deck))
-        battle_state = BattleState(game_state, agent.make_enemy(enemy, game_state), verbose=Verbose.LOG if games <= 3 else Verbose.NO_LOG)
-        start = time.time()
-        battle_state.run()
-        score = battle_state.score()
+    agentname = BOT_NAMES.get(bot, "Sampling")
+    bot_args = (bot, n, verbose, param, transposition, reuse_tree, workers, parallel, horizon, lethal, determinizations, early_stop)
+    log = Verbose.LOG if games <= 3 and jobs <= 1 else Verbose.NO_LOG
+    instrument_file = open(instrument, 'w') if instrument is not None else None
+    trace_writer = TraceWriter(trace) if trace is not None else None
+    for i, score, duration, notes, records, traced in run_games(scenario, games, log, israndom, bot_args, jobs, instrument_file is not None, log_file, log_thread, trace_writer):
         if score > 0.999:
             wins += 1
-        end = time.time()
-        print(f"run ended in {end-start} seconds, score: {score}")
+        print(f"{f'game {i}: ' if jobs > 1 else ''}run ended in {duration} seconds, score: {score}")
+        for note in notes:
+            print(note)
+        for record in records:
+            instrument_file.write(json.dumps(record) + '\n')
+        if traced is not None:
+            trace_writer.write_games(traced)
         scores.append(score)
+    if instrument_file is not None:
+        instrument_file.close()
+    if trace_writer is not None:
+        trace_writer.close()
     if games > 1:
         print(agentname, "average score:", sum(scores)*1.0/len(scores), "win rate:", "%.2f%%"%(wins*100.0/len(scores)))
     
@@ -73,5 +159,25 @@ if __name__ == '__main__':
     parser.add_argument('-g', '--games', type=int, default=1)
     parser.add_argument('-p', '--parameter', type=float, default=0.5)
     parser.add_argument('-r', '--random', action="store_true")
+    parser.add_argument('-t', '--transposition', type=int, default=0, help="capacity of the MCTS transposition table, 0 to disable")
+    parser.add_argument('--no-reuse', action="store_true", help="build a fresh MCTS tree for every decision")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="number of parallel MCTS searches")
+    parser.add_argument('--parallel', choices=['root', 'tree'], default='root', help="root: independent searches in processes, tree: threads sharing one tree")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="number of processes playing games in parallel")
+    parser.add_argument('--instrument', metavar='FILE', help="count and time the engine's hot operations, writing a JSON summary per decision and game to FILE")
+    parser.add_argument('-l', '--log-file', help="log every game to its own file, LOG_FILE_<game>.log")
+    parser.add_argument('--log-thread', action="store_true", help="write the log files from a background thread")
+    parser.add_argument('--trace', metavar='FILE', help="append a replayable binary trace of every game to FILE")
+    parser.add_argument('--horizon-turns', type=int, help="stop rollouts after this many turns and evaluate the state")
+    parser.add_argument('--horizon-steps', type=int, help="stop rollouts after this many actions and evaluate the state")
+    parser.add_argument('--evaluator', choices=list(EVALUATORS.keys()), default="heuristic", help="value of a state where a rollout stopped")
+    parser.add_argument('--lethal', action="store_true", help="play a win this turn as soon as the lethal solver finds one, in decisions and rollouts")
+    parser.add_argument('-k', '--determinizations', type=int, default=0, help="orders of the draw pile drawn per MCTS decision and shared by its iterations, 0 shuffles a copy every iteration")
+    parser.add_argument('--early-stop', type=float, default=0, metavar='Z', help="end an MCTS search once the best action is Z standard errors ahead of the runner-up or cannot be caught, -n stays the cap; 0 disables")
     args = parser.parse_args()
-    main(args.scenario, args.iterations, args.verbose, args.bot, args.games, args.parameter, args.random)
\ No newline at end of file
+    if args.jobs > 1 and args.bot == "human":
+        parser.error("human games cannot be played in parallel")
+    horizon = None
+    if args.horizon_turns is not None or args.horizon_steps is not None:
+        horizon = RolloutHorizon(args.horizon_turns, args.horizon_steps, EVALUATORS[args.evaluator])
+    main(args.scenario, args.iterations, args.verbose, args.bot, args.games, args.parameter, args.random, args.transposition, not args.no_reuse, args.workers, args.parallel, args.jobs, args.instrument, args.log_file, args.log_thread, args.trace, horizon, args.lethal, args.determinizations, args.early_stop)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from enum import Enum
 from config import MAX_STATUS
+from utility import Zobrist
 from typing import Callable
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -87,6 +88,10 @@ class StatusEffectDefinition:
     def _hidden_repr(se: StatusEffectObject):
         raise Exception(f"Hidden status effect {se.definition.name} does not have a representation.")
     
+    # definitions hold lambdas, so they are pickled as a reference into StatusEffectRepo
+    def __reduce__(self):
+        return (StatusEffectRepo.get, (self.name,))
+
     def __repr__(self):
         return self.name
 SEDef = StatusEffectDefinition
@@ -99,6 +104,13 @@ class StatusEffectRepo:
     TOLERANCE = SEDef("Tolerance", SEDef.no_stack, SEDef.get_increase(2), SEDef.zero_done, SEDef.key_value_repr)
     BOMB = SEDef("Bomb", SEDef.unique_stack, SEDef.get_decrease(1), SEDef.zero_done, SEDef.key_value_repr)
 
+    @staticmethod
+    def get(name: str) -> StatusEffectDefinition:
+        for definition in vars(StatusEffectRepo).values():
+            if isinstance(definition, StatusEffectDefinition) and definition.name == name:
+                return definition
+        raise Exception(f"Status effect {name} is not defined in StatusEffectRepo.")
+
 class StatusEffectObject:
     def __init__(self, definition: StatusEffectDefinition, val: int):
         self.val = val
@@ -106,6 +118,11 @@ class StatusEffectObject:
     
     def done(self):
         return self.definition.done(self)
+
+    def clone(self) -> StatusEffectObject:
+        ret = StatusEffectObject.__new__(StatusEffectObject)
+        ret.__dict__.update(self.__dict__)
+        return ret
     
     def __repr__(self) -> str:
         return self.definition.repr(self)
@@ -113,6 +130,24 @@ class StatusEffectObject:
 class StatusEffectState:
     def __init__(self):
         self.status_effects: list[StatusEffectObject] = []
+        self.hash = 0
+
+    def clone(self) -> StatusEffectState:
+        ret = StatusEffectState.__new__(StatusEffectState)
+        ret.status_effects = [se.clone() for se in self.status_effects]
+        ret.hash = self.hash
+        return ret
+
+    def get_state(self):
+        return [(se, se.val) for se in self.status_effects]
+
+    def set_state(self, state):
+        for se, val in state:
+            se.val = val
+            # effects that were removed since the state was recorded still carry their overridden done
+            se.__dict__.pop('done', None)
+        self.status_effects = [se for se, _ in state]
+        self.update_hash()
     
     def get(self, status: StatusEffectDefinition) -> int:
         values = self._get_obj(status)
@@ -154,9 +189,15 @@ class StatusEffectState:
 
     def clean_up(self):
         self.status_effects = []
+        self.hash = 0
 
     def clean(self):
         self.status_effects = [se for se in self.status_effects if not se.done()]
+        self.update_hash()
+
+    # every change to the effects goes through clean, so the hash is only recomputed there
+    def update_hash(self):
+        self.hash = sum([Zobrist.key('status', se.definition.name, se.val) for se in self.status_effects]) & Zobrist.MASK
 
     def __repr__(self) -> str:
         return f'[{",".join([repr(se) for se in self.status_effects if not se.definition.is_hidden])}]'
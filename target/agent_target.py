@@ -81,7 +81,8 @@ class RandomAgentTarget(AgentTarget):
     
     def get(self, performer: Agent, battle_state: BattleState) -> list[Agent]:
         agent_list: list[Agent] = get_agent_set_data(self.among, battle_state)
-        agent = random.choice(agent_list)
+        battle_state.record_random_state()
+        agent = battle_state.rng.choice(agent_list)
         return [agent]
     
     def __repr__(self) -> str:
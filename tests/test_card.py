@@ -0,0 +1,46 @@
+import gc
+import pytest
+from card import Card, CardDefinition, CardRepo
+from config import CardType, Character, Rarity
+from value import ConstValue, UpgradableOnce
+from action.agent_targeted_action import AddBlock
+from target.agent_target import SelfAgentTarget
+
+def make_shield(cost: int, block) -> Card:
+    return Card("TestShield", CardType.SKILL, ConstValue(cost), Character.IRON_CLAD, Rarity.COMMON, AddBlock(block).To(SelfAgentTarget()))
+
+def test_same_card_shares_definition():
+    a = make_shield(1, ConstValue(5))
+    b = make_shield(1, ConstValue(5))
+    assert b.definition is a.definition
+
+def test_name_reused_for_another_card_raises():
+    a = make_shield(1, ConstValue(5))
+    with pytest.raises(Exception):
+        make_shield(2, ConstValue(50))
+    # the same printed values but another upgrade is another card too
+    with pytest.raises(Exception):
+        make_shield(1, UpgradableOnce(5, 8))
+    assert a.mana_cost.peek() == 1
+
+def test_name_is_free_once_unused():
+    a = make_shield(1, ConstValue(5))
+    del a
+    gc.collect()
+    b = make_shield(2, ConstValue(50))
+    assert b.mana_cost.peek() == 2
+    assert b.definition.desc == "Add 50 block to self"
+
+def test_upgrades_follow_their_definition():
+    a = CardRepo.make_deck(["SearingBlow"])[0]
+    b = CardRepo.make_deck(["SearingBlow"])[0]
+    a.upgrade(1)
+    assert a.get_name() == "SearingBlow+"
+    assert b.definition.upgraded(1) is a.definition
+    assert b.upgrade_count == 0
+
+def test_random_cards_are_not_kept():
+    for _ in range(100):
+        CardRepo.get_random()()
+    gc.collect()
+    assert len(CardDefinition.interned) < 100
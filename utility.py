@@ -1,3 +1,4 @@
+from __future__ import annotations
 import random
 import os.path
 
@@ -8,16 +9,29 @@ class ItemSet():
     def __init__(self):
         self.cur = None
 
-    def _sample(self):
+    def clone(self):
+        # items are shared action definitions, only the cursor state is per battle
+        ret = object.__new__(self.__class__)
+        ret.__dict__.update(self.__dict__)
+        return ret
+
+    def get_state(self):
+        return self.cur
+
+    def set_state(self, state):
+        self.cur = state
+
+    def _sample(self, rng):
         raise NotImplementedError("The \"_sample\" method is not implemented for {}.".format(self.__class__.__name__))
     
-    def get(self):
-        ret = self.peek()
+    # rng is the generator of the battle the items are drawn for
+    def get(self, rng=random):
+        ret = self.peek(rng)
         self.cur = None
         return ret
 
-    def peek(self):
-        self.cur = self.cur if self.cur is not None else self._sample()
+    def peek(self, rng=random):
+        self.cur = self.cur if self.cur is not None else self._sample(rng)
         return self.cur
 
 class RoundRobinCore(ItemSet):
@@ -25,8 +39,14 @@ class RoundRobinCore(ItemSet):
         super().__init__()
         self.values = [t for t in values]
         self.index = 0
+
+    def get_state(self):
+        return (self.cur, self.index)
+
+    def set_state(self, state):
+        self.cur, self.index = state
     
-    def _sample(self):
+    def _sample(self, rng):
         ret = self.values[self.index]
         self.index = (self.index + 1) % len(self.values)
         return ret
@@ -36,10 +56,16 @@ class RoundRobin(RoundRobinCore):
         super().__init__(*values)
         self.index = start
 
+# the start is drawn from the battle's generator when the first item is needed
 class RoundRobinRandomStart(RoundRobinCore):
     def __init__(self, *values):
         super().__init__(*values)
-        self.index = random.randrange(0, len(self.values))
+        self.index = None
+
+    def _sample(self, rng):
+        if self.index is None:
+            self.index = rng.randrange(0, len(self.values))
+        return super()._sample(rng)
 
 class ItemSequence(ItemSet):
     def __init__(self, *item_sets):
@@ -47,13 +73,27 @@ class ItemSequence(ItemSet):
         self.item_set_list = [item_set for item_set in item_sets]
         self.index = 0
     
-    def _sample(self):
+    def clone(self):
+        ret = super().clone()
+        ret.item_set_list = [value.clone() if isinstance(value, ItemSet) else value for value in self.item_set_list]
+        return ret
+
+    def get_state(self):
+        return (self.cur, self.index, [value.get_state() if isinstance(value, ItemSet) else None for value in self.item_set_list])
+
+    def set_state(self, state):
+        self.cur, self.index, value_states = state
+        for value, value_state in zip(self.item_set_list, value_states):
+            if isinstance(value, ItemSet):
+                value.set_state(value_state)
+
+    def _sample(self, rng):
         while self.index < len(self.item_set_list):
             try:
                 value = self.item_set_list[self.index]
                 if isinstance(value, ItemSet):
                     item_set = value
-                    return item_set.get()
+                    return item_set.get(rng)
                 else:
                     self.index += 1
                     return value
@@ -67,8 +107,8 @@ class RandomizedItemSet(ItemSet):
         self.values = [t[0] for t in values_and_weights]
         self.weights = [t[1] for t in values_and_weights]
 
-    def _sample(self):
-        return random.choices(self.values, weights=self.weights)[0]
+    def _sample(self, rng):
+        return rng.choices(self.values, weights=self.weights)[0]
 
 class PreventRepeat(ItemSet):
     MAX_TRIES = 100
@@ -80,10 +120,22 @@ class PreventRepeat(ItemSet):
         self.invalid_count = invalid_count
         self.counter: int = 0
         self.consecutive = consecutive
+
+    def clone(self):
+        ret = super().clone()
+        ret.wrapped = self.wrapped.clone()
+        return ret
+
+    def get_state(self):
+        return (self.cur, self.counter, self.wrapped.get_state())
+
+    def set_state(self, state):
+        self.cur, self.counter, wrapped_state = state
+        self.wrapped.set_state(wrapped_state)
     
-    def _sample(self):
+    def _sample(self, rng):
         for _ in range(PreventRepeat.MAX_TRIES):
-            ret = self.wrapped.get()
+            ret = self.wrapped.get(rng)
             if ret == self.invalid_item:
                 self.counter += 1
                 if self.counter >= self.invalid_count:
@@ -102,8 +154,41 @@ class PreventRepeats(ItemSet):
             invalid_item, invalid_count = invalid
             self.wrapped = PreventRepeat(self.wrapped, invalid_item, invalid_count, consecutive)
 
-    def _sample(self):
-        return self.wrapped.get()
+    def clone(self):
+        ret = super().clone()
+        ret.wrapped = self.wrapped.clone()
+        return ret
+
+    def get_state(self):
+        return (self.cur, self.wrapped.get_state())
+
+    def set_state(self, state):
+        self.cur, wrapped_state = state
+        self.wrapped.set_state(wrapped_state)
+
+    def _sample(self, rng):
+        return self.wrapped.get(rng)
+
+# 64-bit keys for incremental state hashing, derived from the key parts so they are stable across processes
+class Zobrist:
+    MASK = (1 << 64) - 1
+    keys: dict[tuple, int] = {}
+
+    @staticmethod
+    def key(*parts) -> int:
+        key = Zobrist.keys.get(parts)
+        if key is None:
+            import hashlib
+            key = int.from_bytes(hashlib.blake2b(repr(parts).encode(), digest_size=8).digest(), 'little')
+            Zobrist.keys[parts] = key
+        return key
+
+# splitmix64 of the pair, used to derive the seeds of independent random streams from one seed
+def split_seed(seed: int, index: int) -> int:
+    z = (seed + index * 0x9E3779B97F4A7C15) & Zobrist.MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & Zobrist.MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & Zobrist.MASK
+    return z ^ (z >> 31)
 
 class UserInput:
     @staticmethod
@@ -135,6 +220,11 @@ class Broadcast():
     def __init__(self):
         self.listeners = []
 
+    def copy(self) -> Broadcast:
+        ret = Broadcast()
+        ret.listeners = [listener for listener in self.listeners]
+        return ret
+
     def subscribe(self, func, order = -1):
         self.listeners.insert(order, func)
 
@@ -148,6 +238,13 @@ class Event():
         self.before = Broadcast()
         self.after = Broadcast()
         self.values = Broadcast()
+
+    def copy(self) -> Event:
+        ret = Event()
+        ret.before = self.before.copy()
+        ret.after = self.after.copy()
+        ret.values = self.values.copy()
+        return ret
     
     def subscribe_before(self, func, order: int = -1):
         self.before.subscribe(func)
@@ -172,6 +269,7 @@ def get_unique_filename(filename: str, ext: str):
     index = 0
     while os.path.isfile(unique_filename):
         unique_filename = f'{filename}_{index}.{ext}'
+        index += 1
     return unique_filename
 
 class RandomStr:
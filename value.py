@@ -70,14 +70,14 @@ class RandomUniformRange(Value):
         self.value: int = 0
         self.peeked = False
     
-    def get(self):
-        value = self.peek()
+    def get(self, rng=random):
+        value = self.peek(rng)
         self.peeked = False
         return value
     
-    def peek(self):
+    def peek(self, rng=random):
         if not self.peeked:
-            self.value = random.randrange(self.begin, self.end)
+            self.value = rng.randrange(self.begin, self.end)
         return self.value
 
     def negative(self) -> RandomUniformRange:
@@ -0,0 +1,199 @@
+from __future__ import annotations
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from action.game_action import GameAction
+from ggpa.random_bot import RandomAgent
+from utility import split_seed
+from encoding import StateEncoder
+from main import get_scenario, get_scenario_deck, make_battle_state
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from battle import BattleState
+
+# A reset/step interface over many battles of one scenario, in the style of gym's vector environments.
+# Actions are indices into get_action_list(): every card kind of the scenario's deck and then end turn.
+# The reward of a step is the change of score(), so an episode's rewards add up to its final score.
+# Battles that end (or pass max_turns) are reset right away; their final score and result are in the info.
+# With workers, the battles are split among worker processes that step them in place, and all
+# observations, masks and rewards are exchanged through shared memory: one message per worker and step.
+
+def get_action_list(scenario: str) -> list[GameAction]:
+    names = list(dict.fromkeys(get_scenario(scenario)[1]))
+    return [GameAction((name, 0)) for name in names] + [GameAction()]
+
+# observations are the encoding.StateEncoder layout for the scenario's cards and its one enemy
+def get_encoder(scenario: str) -> StateEncoder:
+    return StateEncoder.from_deck(get_scenario_deck(scenario))
+
+def _get_buffer_specs(num_envs: int, observation_size: int, action_count: int) -> dict[str, tuple[tuple[int, ...], type]]:
+    return {
+        'observation': ((num_envs, observation_size), np.float32),
+        'mask': ((num_envs, action_count), np.bool_),
+        'action': ((num_envs,), np.int32),
+        'reward': ((num_envs,), np.float32),
+        'done': ((num_envs,), np.bool_),
+        'truncated': ((num_envs,), np.bool_),
+        'score': ((num_envs,), np.float32),
+        'result': ((num_envs,), np.int8),
+    }
+
+# The battles of one slice of the environments, stepped in the process that owns them.
+# Episode k of environment i is seeded with split_seed(split_seed(seed, i), k), whatever the number of workers.
+class _EnvSlice:
+    def __init__(self, scenario: str, indices: range, buffers: dict[str, np.ndarray], max_turns: int|None):
+        self.scenario = scenario
+        self.indices = indices
+        self.buffers = buffers
+        self.max_turns = max_turns
+        self.actions = get_action_list(scenario)
+        self.kinds = {action.card: i for i, action in enumerate(self.actions[:-1])}
+        self.encoder = get_encoder(scenario)
+        self.states: list[BattleState|None] = [None for _ in indices]
+        self.scores = [0.0 for _ in indices]
+        self.seeds = [0 for _ in indices]
+        self.episodes = [0 for _ in indices]
+
+    def _start(self, j: int):
+        # targets are chosen by a RandomAgent, the actions of the environment only pick the cards
+        state = make_battle_state(self.scenario, RandomAgent(), seed=split_seed(self.seeds[j], self.episodes[j]))
+        state.start_turn()
+        self.states[j] = state
+        self.scores[j] = state.score()
+        self.episodes[j] += 1
+        self._observe(j)
+
+    def _observe(self, j: int):
+        i = self.indices[j]
+        state = self.states[j]
+        self.encoder.encode(state, self.buffers['observation'][i])
+        mask = self.buffers['mask'][i]
+        mask[:] = False
+        for action in state.get_actions():
+            if action.card is None:
+                mask[-1] = True
+            elif action.card in self.kinds:
+                mask[self.kinds[action.card]] = True
+
+    def reset(self, seed: int):
+        for j, i in enumerate(self.indices):
+            self.seeds[j] = split_seed(seed, i)
+            self.episodes[j] = 0
+            self._start(j)
+
+    def step(self):
+        buffers = self.buffers
+        for j, i in enumerate(self.indices):
+            action = int(buffers['action'][i])
+            if not buffers['mask'][i, action]:
+                raise Exception(f"Action {action} is not legal in environment {i}")
+            state = self.states[j]
+            state.step(self.actions[action])
+            score = state.score()
+            buffers['reward'][i] = score - self.scores[j]
+            self.scores[j] = score
+            truncated = not state.ended() and self.max_turns is not None and state.turn > self.max_turns
+            buffers['done'][i] = state.ended() or truncated
+            buffers['truncated'][i] = truncated
+            buffers['score'][i] = score
+            buffers['result'][i] = state.get_end_result()
+            if buffers['done'][i]:
+                self._start(j)
+            else:
+                self._observe(j)
+
+def _run_worker(connection, scenario: str, indices: range, names: dict[str, str], specs: dict, max_turns: int|None):
+    memories = {name: shared_memory.SharedMemory(name=names[name]) for name in specs}
+    buffers = {name: np.ndarray(shape, dtype, buffer=memories[name].buf) for name, (shape, dtype) in specs.items()}
+    envs = _EnvSlice(scenario, indices, buffers, max_turns)
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == 'close':
+                break
+            try:
+                if command == 'reset':
+                    envs.reset(argument)
+                else:
+                    envs.step()
+                connection.send(None)
+            except Exception as e:
+                connection.send(repr(e))
+    finally:
+        del buffers, envs
+        for memory in memories.values():
+            memory.close()
+
+class VecBattleEnv:
+    def __init__(self, scenario: str, num_envs: int, workers: int = 0, max_turns: int|None = None):
+        self.scenario = scenario
+        self.num_envs = num_envs
+        self.actions = get_action_list(scenario)
+        self.observation_size = get_encoder(scenario).size
+        specs = _get_buffer_specs(num_envs, self.observation_size, len(self.actions))
+        self.memories: list[shared_memory.SharedMemory] = []
+        self.connections = []
+        self.processes = []
+        if workers <= 0:
+            self.buffers = {name: np.zeros(shape, dtype) for name, (shape, dtype) in specs.items()}
+            self.local = _EnvSlice(scenario, range(num_envs), self.buffers, max_turns)
+            return
+        self.local = None
+        self.buffers = {}
+        names = {}
+        for name, (shape, dtype) in specs.items():
+            memory = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1))
+            self.memories.append(memory)
+            names[name] = memory.name
+            self.buffers[name] = np.ndarray(shape, dtype, buffer=memory.buf)
+        bounds = np.linspace(0, num_envs, min(workers, num_envs) + 1).astype(int)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_run_worker, args=(worker_connection, scenario, range(start, end), names, specs, max_turns), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def _run(self, command: str, argument=None):
+        if self.local is not None:
+            if command == 'reset':
+                self.local.reset(argument)
+            else:
+                self.local.step()
+            return
+        for connection in self.connections:
+            connection.send((command, argument))
+        errors = [error for error in [connection.recv() for connection in self.connections] if error is not None]
+        if errors:
+            raise Exception("Environment worker failed: {}".format(errors[0]))
+
+    # observations and legal-action masks of the first step of every environment
+    def reset(self, seed: int|None = None) -> tuple[np.ndarray, np.ndarray]:
+        self._run('reset', seed if seed is not None else int(np.random.SeedSequence().generate_state(1, np.uint64)[0]))
+        return self.buffers['observation'].copy(), self.buffers['mask'].copy()
+
+    # actions holds one index into self.actions per environment, it must be allowed by the mask
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+        self.buffers['action'][:] = actions
+        self._run('step')
+        info = {name: self.buffers[name].copy() for name in ('truncated', 'score', 'result')}
+        return self.buffers['observation'].copy(), self.buffers['mask'].copy(), self.buffers['reward'].copy(), self.buffers['done'].copy(), info
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+        self.buffers = {}
+        for memory in self.memories:
+            memory.close()
+            memory.unlink()
+        self.memories = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()